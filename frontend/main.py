@@ -1,13 +1,20 @@
 import streamlit as st
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+from http.cookiejar import DefaultCookiePolicy
 import os
+import json
 import time
 
 load_dotenv()
 
 API_URL = os.getenv("API_URL")
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", 120))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
 
 # Page configuration with custom styling
 st.set_page_config(
@@ -238,10 +245,43 @@ if "username" not in st.session_state:
     st.session_state.mode = "auth"
     st.session_state.chat_history = []
 
+# One keep-alive connection pool per frontend process, shared by every rerun
+# and browser session so requests skip the TCP/TLS handshake to the backend
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    # credentials go with each request; never share cookies between users
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=HTTP_POOL_SIZE,
+        # reconnect once if the proxy dropped an idle pooled connection
+        max_retries=Retry(total=1, connect=1, read=0, status=0, backoff_factor=0.2),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+def api(method, path, **kwargs):
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    return get_session().request(method, f"{API_URL}{path}", **kwargs)
+
 # Auth header
 def get_auth():
     return HTTPBasicAuth(st.session_state.username, st.session_state.password)
 
+# Parse a text/event-stream response into (event, data) pairs
+def iter_sse(res):
+    event = "message"
+    for line in res.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
 # Main header component
 def render_header():
     st.markdown("""
@@ -277,7 +317,7 @@ def auth_ui():
                 if submitted and username and password:
                     with st.spinner("Authenticating..."):
                         try:
-                            res = requests.post(f"{API_URL}/login", auth=HTTPBasicAuth(username, password))
+                            res = api("POST", "/login", auth=HTTPBasicAuth(username, password))
                             if res.status_code == 200:
                                 user_data = res.json()
                                 st.session_state.username = username
@@ -314,7 +354,7 @@ def auth_ui():
                     with st.spinner("Creating account..."):
                         try:
                             payload = {"username": new_user, "password": new_pass, "role": new_role}
-                            res = requests.post(f"{API_URL}/signup", json=payload)
+                            res = api("POST", "/signup", json=payload)
                             if res.status_code == 200:
                                 st.success(" Account created successfully! Please login.")
                             else:
@@ -324,6 +364,28 @@ def auth_ui():
         
         st.markdown('</div>', unsafe_allow_html=True)
 
+# Poll the ingestion job and show its progress until it finishes
+def wait_for_indexing(doc_id, timeout=600):
+    bar = st.progress(0, text="Queued for indexing...")
+    deadline = time.time() + timeout
+    job = {}
+    while time.time() < deadline:
+        res = api("GET", f"/upload_docs/{doc_id}/status", auth=get_auth(), timeout=(CONNECT_TIMEOUT, 10))
+        if res.status_code != 200:
+            break
+        job = res.json()
+        progress = job["progress"]
+        embedded = progress["chunks_embedded"]
+        done = progress["vectors_upserted"] / embedded if embedded else 0.0
+        bar.progress(min(done, 1.0), text=(
+            f"{job['status'].capitalize()}: {progress['pages_parsed']} pages parsed, "
+            f"{embedded} chunks embedded, {progress['vectors_upserted']} vectors stored"
+        ))
+        if job["status"] in ("completed", "failed", "cancelled"):
+            break
+        time.sleep(1)
+    return job
+
 # Upload documents UI (Admin only)
 def upload_docs():
     st.markdown('<div class="upload-card">', unsafe_allow_html=True)
@@ -351,11 +413,19 @@ def upload_docs():
                 try:
                     files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
                     data = {"role": role_for_doc}
-                    res = requests.post(f"{API_URL}/upload_docs", files=files, data=data, auth=get_auth())
-                    if res.status_code == 200:
+                    res = api("POST", "/upload_docs", files=files, data=data, auth=get_auth())
+                    if res.status_code in (200, 202):
                         doc_info = res.json()
-                        st.success(f" Successfully uploaded: {uploaded_file.name}")
                         st.info(f"📋 Document ID: {doc_info['doc_id']} | Access: {doc_info['accessible_to']}")
+                        job = wait_for_indexing(doc_info["doc_id"])
+                        if job.get("status") == "completed" and job["progress"].get("skipped"):
+                            st.info(f" {uploaded_file.name} is already indexed for this role")
+                        elif job.get("status") == "completed":
+                            st.success(f" Successfully uploaded: {uploaded_file.name}")
+                        elif job.get("status") in ("failed", "cancelled"):
+                            st.error(f" Indexing {job['status']}: {job.get('error') or uploaded_file.name}")
+                        else:
+                            st.info(" Still indexing in the background. You can keep using the app.")
                     else:
                         st.error(f" {res.json().get('detail', 'Upload failed')}")
                 except Exception as e:
@@ -389,29 +459,41 @@ def chat_interface():
             submitted = st.form_submit_button("🚀 Send Message", use_container_width=True)
         
         if submitted and msg.strip():
-            with st.spinner("🤔 AI is thinking..."):
-                try:
-                    res = requests.post(f"{API_URL}/chat", data={"message": msg}, auth=get_auth())
-                    if res.status_code == 200:
-                        reply = res.json()
-                        
-                        # Display answer
-                        st.markdown("### 💡 Answer:")
-                        st.success(reply["answer"])
-                        
-                        # Display sources if available
-                        if reply.get("sources"):
-                            st.markdown("### 📚 Sources:")
-                            for i, src in enumerate(reply["sources"], 1):
-                                st.markdown(f"""
-                                <div class="source-item">
-                                    <strong>Source {i}:</strong> {src}
-                                </div>
-                                """, unsafe_allow_html=True)
-                    else:
-                        st.error(f" {res.json().get('detail', 'Something went wrong')}")
-                except Exception as e:
-                    st.error(" Connection error. Please try again.")
+            try:
+                with st.spinner("🤔 AI is thinking..."):
+                    res = api("POST", "/chat/stream", data={"message": msg}, auth=get_auth(), stream=True)
+                if res.status_code == 200:
+                    sources = []
+                    answer = ""
+                    st.markdown("### 💡 Answer:")
+                    answer_box = st.empty()
+
+                    # Render tokens as the server-sent events arrive
+                    for event, data in iter_sse(res):
+                        if event == "sources":
+                            sources = data.get("sources", [])
+                        elif event == "token":
+                            answer += data["text"]
+                            answer_box.success(answer + " ▌")
+                        elif event == "error":
+                            st.error(f" {data.get('detail', 'Something went wrong')}")
+                    answer_box.success(answer)
+
+                    # Display sources if available
+                    if sources:
+                        st.markdown("### 📚 Sources:")
+                        for i, src in enumerate(sources, 1):
+                            st.markdown(f"""
+                            <div class="source-item">
+                                <strong>Source {i}:</strong> {src}
+                            </div>
+                            """, unsafe_allow_html=True)
+                elif res.status_code == 429:
+                    st.warning(f"⏳ The assistant is busy. Please try again in {res.headers.get('Retry-After', 'a few')} seconds.")
+                else:
+                    st.error(f" {res.json().get('detail', 'Something went wrong')}")
+            except Exception as e:
+                st.error(" Connection error. Please try again.")
         elif submitted:
             st.warning("⚠️ Please enter a question")
     
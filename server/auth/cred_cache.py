@@ -0,0 +1,117 @@
+import os
+import hmac
+import time
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from config.shared_state import shared_state
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 1024))
+AUTH_CACHE_SECRET = os.getenv("AUTH_CACHE_SECRET")  # hex; workers sharing the cache need the same key
+
+
+class CredentialCache:
+    """Bounded TTL cache of credentials that already passed bcrypt.
+
+    Entries are keyed by an HMAC of username + password under a per-process
+    secret, so neither the plaintext nor a cheap unsalted hash is kept in memory.
+    With `shared` set, entries live in the SQLite file instead so every worker
+    sees the same logins and invalidations; the secret never touches disk.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL, secret: bytes = None, shared=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._secret = secret or secrets.token_bytes(32)
+        self._entries = OrderedDict()  # digest -> (expires_at, user)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if shared:
+            shared.schema(
+                "CREATE TABLE IF NOT EXISTS credentials (digest TEXT PRIMARY KEY, username TEXT NOT NULL, "
+                "role TEXT NOT NULL, expires REAL NOT NULL)",
+                "CREATE INDEX IF NOT EXISTS credentials_username ON credentials (username)",
+            )
+
+    def _digest(self, username: str, password: str) -> str:
+        msg = username.encode("utf-8") + b"\x00" + password.encode("utf-8")
+        return hmac.new(self._secret, msg, hashlib.sha256).hexdigest()
+
+    def get(self, username: str, password: str):
+        key = self._digest(username, password)
+        if self.shared:
+            rows = self.shared.execute(
+                "SELECT username, role FROM credentials WHERE digest = ? AND expires > ?", (key, time.time())
+            )
+            if not rows:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {"username": rows[0][0], "role": rows[0][1]}
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, username: str, password: str, user: dict):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        key = self._digest(username, password)
+        if self.shared:
+            with self.shared.transaction() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO credentials VALUES (?, ?, ?, ?)",
+                    (key, user["username"], user["role"], time.time() + self.ttl),
+                )
+                db.execute(
+                    "DELETE FROM credentials WHERE digest IN "
+                    "(SELECT digest FROM credentials ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,),
+                )
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, username: str):
+        """Drop every cached credential for `username` (password or role changed)."""
+        if self.shared:
+            self.shared.execute("DELETE FROM credentials WHERE username = ?", (username,))
+            return
+        with self._lock:
+            stale = [k for k, (_, user) in self._entries.items() if user["username"] == username]
+            for k in stale:
+                del self._entries[k]
+
+    def clear(self):
+        if self.shared:
+            self.shared.execute("DELETE FROM credentials")
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        if self.shared:
+            size = self.shared.execute("SELECT COUNT(*) FROM credentials")[0][0]
+            return {"hits": self.hits, "misses": self.misses, "size": size}
+        with self._lock:
+            size = len(self._entries)
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+credential_cache = CredentialCache(
+    secret=bytes.fromhex(AUTH_CACHE_SECRET) if AUTH_CACHE_SECRET else None,
+    shared=shared_state,
+)
@@ -3,28 +3,42 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
 from .models import SignupRequest
 from .hash_utils import hash_password, verify_password
-from config.db import users_collection
+from .cred_cache import credential_cache
+from config.db import get_users_collection
+from metrics.registry import timed, cache_collector
 
 router = APIRouter()
 security = HTTPBasic()
+cache_collector("credentials", credential_cache)
 
 
 def authenticate(credentials: HTTPBasicCredentials = Depends(security)):
-    user = users_collection.find_one({"username": credentials.username})
-    if not user or not verify_password(credentials.password, user["password"]):
+    cached = credential_cache.get(credentials.username, credentials.password)
+    if cached:
+        return cached
+
+    with timed("auth_db"):
+        user = get_users_collection().find_one({"username": credentials.username})
+    with timed("auth_bcrypt"):
+        valid = bool(user) and verify_password(credentials.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    return {"username": user["username"], "role": user["role"]}
+    verified = {"username": user["username"], "role": user["role"]}
+    credential_cache.put(credentials.username, credentials.password, verified)
+    return verified
 
 
 @router.post("/signup")
 def signup(req: SignupRequest):
-    if users_collection.find_one({"username": req.username}):
+    if get_users_collection().find_one({"username": req.username}):
         raise HTTPException(status_code=400, detail="User already exists")
-    users_collection.insert_one({
+    get_users_collection().insert_one({
         "username": req.username,
         "password": hash_password(req.password),
         "role": req.role
     })
+    # a re-created account must not be served from stale cached credentials
+    credential_cache.invalidate_user(req.username)
     return {"message": "User created successfully"}
 
 
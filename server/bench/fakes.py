@@ -0,0 +1,123 @@
+# Deterministic local stand-ins for Gemini, Groq, Pinecone and Mongo. Each
+# sleeps for a configurable latency to approximate the real network cost.
+import re
+import time
+import asyncio
+import hashlib
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class FakeEmbeddings:
+    """Hashed bag-of-words vectors: texts sharing words get similar vectors,
+    so retrieval and the semantic caches behave realistically."""
+
+    def __init__(self, dim: int = 768, latency: float = 0.05):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> list:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_query(self, text: str, **kwargs) -> list:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_documents(self, texts: list, **kwargs) -> list:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+
+class FakeChatModel(BaseChatModel):
+    """Returns a fixed-length answer after `latency` seconds to first token,
+    then one token every `token_latency` seconds."""
+
+    latency: float = 0.3
+    token_latency: float = 0.005
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages) -> list:
+        prompt = " ".join(str(m.content) for m in messages)
+        return [f"tok{i % 10} " for i in range(self.answer_tokens)] + [f"(prompt {len(prompt)} chars)"]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class LatencyIndex:
+    """Wraps a VectorStore and adds a fixed round-trip delay per call."""
+
+    def __init__(self, inner, latency: float = 0.03):
+        self.inner = inner
+        self.latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if name not in ("upsert", "query", "delete", "fetch"):
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return attr(*args, **kwargs)
+        return call
+
+
+class FakeUsersCollection:
+    def __init__(self, latency: float = 0.005):
+        self.latency = latency
+        self.docs = []
+
+    def _match(self, query: dict):
+        return next((d for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+    def find_one(self, query: dict):
+        time.sleep(self.latency)
+        doc = self._match(query)
+        return dict(doc) if doc else None
+
+    def insert_one(self, doc: dict):
+        time.sleep(self.latency)
+        self.docs.append(dict(doc))
+
+    def update_one(self, query: dict, update: dict):
+        time.sleep(self.latency)
+        doc = self._match(query)
+        if doc:
+            doc.update(update.get("$set", {}))
+
+
+class FakeMongoClient:
+    def __init__(self, users: FakeUsersCollection):
+        self.users = users
+
+    def __getitem__(self, db_name):
+        return {"users": self.users}
@@ -0,0 +1,210 @@
+"""Offline benchmark for /chat and document ingestion.
+
+Runs the real FastAPI app and ingestion pipeline against the local stand-ins
+in bench/fakes.py, so numbers are comparable across changes without API
+keys. From the server directory:
+
+    python -m bench.run --requests 200 --concurrency 20
+    python -m bench.run --endpoint /chat/stream --no-cache --skip-ingest
+"""
+import os
+import sys
+import time
+import atexit
+import shutil
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+QUESTIONS = [
+    "What is the first-line treatment for hypertension?",
+    "What are the symptoms of diabetes mellitus?",
+    "How is community-acquired pneumonia diagnosed?",
+    "What causes iron deficiency anemia?",
+    "aspirin",
+    "What is the management of acute myocardial infarction?",
+    "What are the complications of cirrhosis?",
+    "How is asthma treated in adults?",
+    "What are the signs of hyperthyroidism?",
+    "metformin",
+    "What is the differential diagnosis of chest pain?",
+    "How is chronic kidney disease staged?",
+    "What are the causes of acute pancreatitis?",
+    "What is the treatment for migraine?",
+    "What are the symptoms of tuberculosis?",
+    "heparin",
+    "How is rheumatoid arthritis diagnosed?",
+    "What is the treatment of septic shock?",
+    "What are risk factors for stroke?",
+    "How is hepatitis B transmitted?",
+]
+DEFAULT_PDF = Path(__file__).resolve().parents[2] / "uploaded_docs" / "Current Essentials of Medicine(1)(1).pdf"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--endpoint", default="/chat", choices=["/chat", "/chat/stream"])
+    parser.add_argument("--role", default="doctor")
+    parser.add_argument("--pdf", default=str(DEFAULT_PDF))
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--no-cache", action="store_true", help="disable embedding and answer caches")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--index-latency", type=float, default=0.03)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    return parser.parse_args()
+
+
+def configure_env(workdir: str):
+    # must run before any app module is imported: they read these at import
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_PATH": os.path.join(workdir, "vector_index"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.json"),
+        "DOC_MANIFEST_PATH": os.path.join(workdir, "doc_manifest.json"),
+        "MEMORY_DIR": os.path.join(workdir, "user_memory"),
+        "EMBED_DIM": "768",
+        "WARMUP_ON_STARTUP": "false",
+    })
+    # one benchmark user would trip the per-user rate limit; stage limits stay on
+    os.environ.setdefault("USER_RATE", "0")
+    os.environ.setdefault("ROLE_RATE", "0")
+    os.environ.pop("EMBED_CACHE_PATH", None)
+
+
+def install_fakes(args):
+    from config import clients, db
+    from vectordb import create_index, vector_index
+    from bench.fakes import FakeEmbeddings, FakeChatModel, LatencyIndex, FakeUsersCollection, FakeMongoClient
+
+    clients.embed_model.override(FakeEmbeddings(latency=args.embed_latency))
+    clients.llm.override(FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency))
+    vector_index.override(LatencyIndex(create_index(), latency=args.index_latency))
+    db.mongo.override(FakeMongoClient(FakeUsersCollection(latency=args.db_latency)))
+
+    if args.no_cache:
+        from chat.embed_cache import embedding_cache
+        from chat.answer_cache import answer_cache
+        embedding_cache.max_size = 0
+        answer_cache.size = 0
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def report(title: str, latencies: list, elapsed: float, errors: int):
+    latencies = sorted(latencies)
+    print(f"\n{title}")
+    print(f"  requests   {len(latencies) + errors} ({errors} errors) in {elapsed:.2f}s -> {len(latencies) / elapsed:.1f} req/s")
+    for q in (50, 95, 99):
+        print(f"  p{q:<9} {percentile(latencies, q) * 1000:.1f} ms")
+
+
+def report_stages():
+    from metrics.registry import stage_seconds
+    print("\nServer-side stages (count, mean)")
+    for key, (count, total) in sorted(stage_seconds.snapshot().items()):
+        print(f"  {dict(key)['stage']:<22} {count:>6}  {total / count * 1000:8.1f} ms")
+
+
+async def bench_ingest(args):
+    from docs.vectorstore import index_document
+
+    progress = {}
+    start = time.perf_counter()
+    await index_document(Path(args.pdf), Path(args.pdf).name, args.role, "bench-doc", progress)
+    elapsed = time.perf_counter() - start
+    print(f"\nIngestion of {Path(args.pdf).name}")
+    print(f"  {elapsed:.2f}s  {progress['pages_parsed']} pages ({progress['pages_parsed'] / elapsed:.1f}/s), "
+          f"{progress['chunks_embedded']} chunks embedded ({progress['chunks_embedded'] / elapsed:.1f}/s), "
+          f"{progress['vectors_upserted']} vectors upserted")
+
+
+async def bench_chat(args):
+    import httpx
+    from main import app
+
+    auth = ("bench-user", "bench-password")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        res = await client.post("/signup", json={"username": auth[0], "password": auth[1], "role": args.role})
+        res.raise_for_status()
+
+        latencies, first_tokens, errors = [], [], 0
+        queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(QUESTIONS[i % len(QUESTIONS)])
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                question = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    if args.endpoint == "/chat/stream":
+                        seen_first = False
+                        async with client.stream("POST", args.endpoint, data={"message": question}, auth=auth) as res:
+                            res.raise_for_status()
+                            async for line in res.aiter_lines():
+                                if not seen_first and line.startswith("event: token"):
+                                    seen_first = True
+                                    first_tokens.append(time.perf_counter() - start)
+                    else:
+                        res = await client.post(args.endpoint, data={"message": question}, auth=auth)
+                        res.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors += 1
+                    print(f"  request failed: {e!r}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    report(f"{args.endpoint} at concurrency {args.concurrency}", latencies, elapsed, errors)
+    if first_tokens:
+        first_tokens.sort()
+        print(f"  time to first token p50 {percentile(first_tokens, 50) * 1000:.1f} ms, "
+              f"p95 {percentile(first_tokens, 95) * 1000:.1f} ms")
+
+
+async def run(args):
+    if not args.skip_ingest:
+        await bench_ingest(args)
+    else:
+        # still need something to retrieve
+        from vectordb import get_index
+        from vectordb.lexical import lexical_index
+        from config.clients import embed_model
+        texts = [q.rstrip("?") + " is covered in chapter " + str(i) for i, q in enumerate(QUESTIONS)]
+        vectors = [
+            (f"seed-{i}", vec, {"role": args.role, "text": text, "source": "seed", "page": i})
+            for i, (text, vec) in enumerate(zip(texts, embed_model.get().embed_documents(texts)))
+        ]
+        get_index().upsert(vectors)
+        lexical_index.add(args.role, vectors)
+    await bench_chat(args)
+    report_stages()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="medchat-bench-")
+    # registered before the stores exist, so it runs after their atexit flushes
+    atexit.register(shutil.rmtree, workdir, True)
+    configure_env(workdir)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    install_fakes(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import math
+import time
+import asyncio
+import functools
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from metrics.registry import count, registry
+from config.shared_state import shared_state, off_loop
+
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+VECTOR_QUERY_CONCURRENCY = int(os.getenv("VECTOR_QUERY_CONCURRENCY", 8))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+STAGE_MAX_QUEUE = int(os.getenv("STAGE_MAX_QUEUE", 64))  # waiters per stage before shedding
+STAGE_QUEUE_TIMEOUT = float(os.getenv("STAGE_QUEUE_TIMEOUT", 10))
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 30))
+USER_RATE = float(os.getenv("USER_RATE", 1))  # requests per second, refilled continuously
+USER_BURST = float(os.getenv("USER_BURST", 5))
+ROLE_RATE = float(os.getenv("ROLE_RATE", 20))
+ROLE_BURST = float(os.getenv("ROLE_BURST", 40))
+RATE_LIMIT_KEYS = 10000
+
+# absolute time.monotonic() by which the current request must finish
+_deadline = ContextVar("request_deadline", default=None)
+
+
+class OverloadedError(Exception):
+    """Raised when work is shed; `retry_after` is a hint in whole seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def start_deadline(seconds: float = REQUEST_DEADLINE):
+    _deadline.set(time.monotonic() + seconds)
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    """Upstream 429s (groq.RateLimitError, google ResourceExhausted)."""
+    return getattr(e, "status_code", None) == 429 or getattr(e, "code", None) == 429
+
+
+class StageLimiter:
+    """Caps concurrent calls to one upstream stage.
+
+    Callers beyond `limit` wait in line up to the request deadline (or
+    `timeout`); with `max_queue` already waiting, new callers are rejected
+    at once with OverloadedError. Blocking calls made through `run` use a
+    pool sized to the limit, so one slow stage cannot starve the default
+    executor. Upstream rate-limit errors are surfaced as OverloadedError.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int = STAGE_MAX_QUEUE, timeout: float = STAGE_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 1.0  # EWMA seconds, for Retry-After
+        self._semaphore = None
+        self._executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"{name}-stage")
+
+    def retry_after(self) -> float:
+        return self.service_time * (self.waiting + 1) / self.limit
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                count(f"shed_{self.name}")
+                raise OverloadedError(f"{self.name} queue is full", self.retry_after())
+            deadline = _deadline.get()
+            wait = self.timeout if deadline is None else min(self.timeout, deadline - time.monotonic())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), max(wait, 0))
+            except asyncio.TimeoutError:
+                count(f"shed_{self.name}")
+                raise OverloadedError(f"Timed out waiting for {self.name}", self.retry_after()) from None
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limit_error(e):
+                count(f"upstream_rate_limited_{self.name}")
+                raise OverloadedError(f"{self.name} is rate limited upstream", self.retry_after()) from e
+            raise
+        finally:
+            self.service_time = 0.9 * self.service_time + 0.1 * (time.monotonic() - start)
+            self.active -= 1
+            self._semaphore.release()
+
+    async def run(self, fn, *args, **kwargs):
+        async with self.slot():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+
+class RateLimiter:
+    """Token buckets per key: `rate` tokens a second up to `burst`.
+
+    With `shared` set the buckets live in SQLite, so the limit holds across
+    all workers rather than per process.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = RATE_LIMIT_KEYS, name: str = "", shared=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.name = name
+        self.shared = shared
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._shared_calls = 0
+        if shared:
+            shared.schema(
+                "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _take(self, tokens: float, updated: float, now: float):
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+        return (tokens - 1 if not wait else tokens), wait
+
+    def _acquire_shared(self, key: str) -> float:
+        key = f"{self.name}:{key}"
+        now = time.time()
+        self._shared_calls += 1
+        with self.shared.transaction() as db:
+            row = db.execute("SELECT tokens, updated FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            tokens, wait = self._take(*(row or (self.burst, now)), now)
+            db.execute("INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?)", (key, tokens, now))
+            if self._shared_calls % 1000 == 0:
+                # a bucket idle this long is full again anyway
+                db.execute("DELETE FROM rate_limits WHERE updated < ?", (now - self.burst / self.rate,))
+        return wait
+
+    def acquire(self, key: str) -> float:
+        """Take one token; returns 0 on success, else seconds until one is free."""
+        if self.rate <= 0:
+            return 0
+        if self.shared:
+            return self._acquire_shared(key)
+        now = time.monotonic()
+        with self._lock:
+            tokens, wait = self._take(*self._buckets.pop(key, (self.burst, now)), now)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                # least recently used first
+                self._buckets.pop(next(iter(self._buckets)))
+        return wait
+
+
+embed_limiter = StageLimiter("embed", EMBED_CONCURRENCY)
+vector_query_limiter = StageLimiter("vector_query", VECTOR_QUERY_CONCURRENCY)
+llm_limiter = StageLimiter("llm", LLM_CONCURRENCY)
+user_rate_limiter = RateLimiter(USER_RATE, USER_BURST, name="user", shared=shared_state)
+role_rate_limiter = RateLimiter(ROLE_RATE, ROLE_BURST, name="role", shared=shared_state)
+
+
+def _rate_limit_wait(user: dict) -> float:
+    return user_rate_limiter.acquire(user["username"]) or role_rate_limiter.acquire(user["role"])
+
+
+async def admit(user: dict, deadline: float = REQUEST_DEADLINE):
+    """Rate-limit a chat request by user, then by role, and start its deadline."""
+    wait = await off_loop(_rate_limit_wait, user)
+    if wait:
+        count("rate_limited")
+        raise OverloadedError("Too many requests", wait)
+    start_deadline(deadline)
+
+
+def _collect():
+    lines = []
+    for limiter in (embed_limiter, vector_query_limiter, llm_limiter):
+        lines.append(f'medchat_stage_active{{stage="{limiter.name}"}} {limiter.active}')
+        lines.append(f'medchat_stage_waiting{{stage="{limiter.name}"}} {limiter.waiting}')
+    return lines
+
+
+registry.collector(_collect)
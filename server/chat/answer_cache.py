@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from config.shared_state import shared_state
+from chat.embed_cache import normalize_query
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.97))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 512))  # per role
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600))
+SHARED_LOG_ROWS = 8 * ANSWER_CACHE_SIZE  # rows kept in the shared log, all roles
+
+
+class _RoleBucket:
+    def __init__(self, dim: int, size: int):
+        self.vectors = np.zeros((size, dim), dtype=np.float32)
+        self.answers = [None] * size
+        self.created = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.next_slot = 0
+
+
+class AnswerCache:
+    """Per-role semantic cache: returns a stored answer when a new query's
+    embedding is within `threshold` cosine similarity of a cached one.
+
+    With `shared` set, puts and invalidations are appended to a SQLite log
+    and every worker replays new log rows into its own buckets before a
+    lookup, so similarity search stays in-process while the contents are
+    shared. A role value of "*" in the log clears every role.
+
+    Answers produced without a query embedding (the lexical fast path) are
+    cached by exact normalized query instead, via `get_exact`/`put_exact`.
+
+    Every invalidation bumps the role's `generation`. Callers take it before
+    retrieving context and pass it to the put, which is dropped if the role
+    was invalidated in between, since the answer may predate new documents.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 shared=None):
+        self.threshold = threshold
+        self.size = size
+        self.ttl = ttl
+        self.shared = shared
+        self._buckets = {}
+        self._exact = {}  # role -> OrderedDict(normalized query -> (created, answer))
+        self._generations = {}  # role -> invalidations seen; "*" counts clears
+        self._lock = threading.Lock()
+        self._seen = 0  # last shared log id applied
+        self._shared_puts = 0
+        self.hits = 0
+        self.misses = 0
+        if shared:
+            shared.schema(
+                "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY AUTOINCREMENT, role TEXT NOT NULL, "
+                "created REAL NOT NULL, vector BLOB, answer TEXT, query TEXT)"
+            )
+            with shared.transaction() as db:
+                # logs created before exact-query entries existed
+                if "query" not in {row[1] for row in db.execute("PRAGMA table_info(answers)")}:
+                    db.execute("ALTER TABLE answers ADD COLUMN query TEXT")
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _sync(self):
+        if not self.shared:
+            return
+        rows = self.shared.execute(
+            "SELECT id, role, created, vector, answer, query FROM answers WHERE id > ? ORDER BY id", (self._seen,)
+        )
+        for row_id, role, created, vector, answer, query in rows:
+            if answer is None:
+                self._drop(role)
+            elif query is not None:
+                self._store_exact(role, query, json.loads(answer), created)
+            else:
+                self._store(role, np.frombuffer(vector, dtype=np.float32), json.loads(answer), created)
+            self._seen = row_id
+
+    def _append(self, role: str, vec=None, answer: dict = None, query: str = None):
+        self._shared_puts += 1
+        with self.shared.transaction() as db:
+            db.execute(
+                "INSERT INTO answers (role, created, vector, answer, query) VALUES (?, ?, ?, ?, ?)",
+                (role, time.time(), None if vec is None else vec.tobytes(), None if answer is None else json.dumps(answer),
+                 query),
+            )
+            if self._shared_puts % 100 == 0:
+                db.execute(
+                    # invalidations go by age only: a worker that has not
+                    # replayed one yet would otherwise keep serving stale answers
+                    "DELETE FROM answers WHERE created < ? "
+                    "OR (answer IS NOT NULL AND id <= (SELECT MAX(id) FROM answers) - ?)",
+                    (time.time() - self.ttl, SHARED_LOG_ROWS),
+                )
+
+    def get(self, role: str, embedding):
+        vec = self._unit(embedding)
+        with self._lock:
+            self._sync()
+            bucket = self._buckets.get(role)
+            if bucket is None or not bucket.count or bucket.vectors.shape[1] != vec.shape[0]:
+                self.misses += 1
+                return None
+            n = bucket.count
+            sims = bucket.vectors[:n] @ vec
+            sims[time.time() - bucket.created[:n] > self.ttl] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(bucket.answers[best])
+
+    def generation(self, role: str) -> tuple:
+        with self._lock:
+            self._sync()
+            return self._generation(role)
+
+    def _generation(self, role: str) -> tuple:
+        return self._generations.get("*", 0), self._generations.get(role, 0)
+
+    def _stale(self, role: str, generation) -> bool:
+        if generation is None:
+            return False
+        self._sync()
+        return self._generation(role) != generation
+
+    def put(self, role: str, embedding, answer: dict, generation=None):
+        if self.size <= 0:
+            return
+        vec = self._unit(embedding)
+        with self._lock:
+            if self._stale(role, generation):
+                return
+            if self.shared:
+                self._append(role, vec, answer)
+                self._sync()
+            else:
+                self._store(role, vec, answer, time.time())
+
+    def get_exact(self, role: str, query: str):
+        key = normalize_query(query)
+        with self._lock:
+            self._sync()
+            entries = self._exact.get(role)
+            entry = entries.get(key) if entries else None
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put_exact(self, role: str, query: str, answer: dict, generation=None):
+        if self.size <= 0:
+            return
+        key = normalize_query(query)
+        with self._lock:
+            if self._stale(role, generation):
+                return
+            if self.shared:
+                self._append(role, answer=answer, query=key)
+                self._sync()
+            else:
+                self._store_exact(role, key, answer, time.time())
+
+    def _store_exact(self, role: str, key: str, answer: dict, created: float):
+        entries = self._exact.setdefault(role, OrderedDict())
+        entries[key] = (created, dict(answer))
+        entries.move_to_end(key)
+        while len(entries) > self.size:
+            entries.popitem(last=False)
+
+    def _drop(self, role: str):
+        self._generations[role] = self._generations.get(role, 0) + 1
+        if role == "*":
+            self._buckets.clear()
+            self._exact.clear()
+        else:
+            self._buckets.pop(role, None)
+            self._exact.pop(role, None)
+
+    def _store(self, role: str, vec: np.ndarray, answer: dict, created: float):
+        bucket = self._buckets.get(role)
+        if bucket is None or bucket.vectors.shape[1] != vec.shape[0]:
+            bucket = self._buckets[role] = _RoleBucket(vec.shape[0], self.size)
+        slot = bucket.next_slot
+        bucket.vectors[slot] = vec
+        bucket.answers[slot] = dict(answer)
+        bucket.created[slot] = created
+        bucket.next_slot = (slot + 1) % self.size
+        bucket.count = min(bucket.count + 1, self.size)
+
+    def invalidate_role(self, role: str):
+        with self._lock:
+            self._drop(role)
+            if self.shared:
+                self._append(role)
+
+    def clear(self):
+        with self._lock:
+            self._drop("*")
+            if self.shared:
+                self._append("*")
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = sum(b.count for b in self._buckets.values()) + sum(len(e) for e in self._exact.values())
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+answer_cache = AnswerCache(shared=shared_state)
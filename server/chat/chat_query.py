@@ -1,26 +1,29 @@
 import os
+import re
 import asyncio
+from contextlib import aclosing
 from dotenv import load_dotenv
-from pinecone import Pinecone
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
+from chat.embed_cache import embedding_cache, normalize_query
+from chat.embed_batcher import EmbeddingBatcher
+from chat.answer_cache import answer_cache
+from chat.context import pack_context
+from chat.memory import conversation_memory
+from chat.admission import embed_limiter, vector_query_limiter, llm_limiter, start_deadline
+from chat.single_flight import SingleFlight, flight_collector
+from config.clients import embed_model, llm, EMBED_MODEL_NAME
+from config.shared_state import off_loop
+from vectordb import get_index
+from vectordb.lexical import lexical_index, reciprocal_rank_fusion
+from metrics.registry import timed, count, cache_collector
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-PINECONE_API_KEY = os.getenv("PINECIONE_API_KEY")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
-
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-
-pc=Pinecone(api_key=PINECONE_API_KEY)
-index=pc.Index(PINECONE_INDEX_NAME)
-
-embed_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-
-llm=ChatGroq(temperature=0.3,model_name="llama3-8b-8192",groq_api_key=GROQ_API_KEY)
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", 6))
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+LEXICAL_FAST_PATH_SCORE = float(os.getenv("LEXICAL_FAST_PATH_SCORE", 0.8))  # above 1 disables the fast path
+LEXICAL_FAST_PATH_MAX_TERMS = int(os.getenv("LEXICAL_FAST_PATH_MAX_TERMS", 3))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", 4))  # questions of one batch in progress at once
 
 
 prompt=PromptTemplate.from_template("""
@@ -29,6 +32,8 @@ You are a helpful healthcare assistant. Answer the following question
 
 
 
+    Conversation so far:{history}
+
     Question:{question}
                                     
     Context:{context}
@@ -40,32 +45,266 @@ You are a helpful healthcare assistant. Answer the following question
 
 """)
 
-rag_chain=prompt | llm
 
+def rag_chain():
+    return prompt | llm.get()
+
+NO_INFO_ANSWER="No relevant info found"
+
+# what _answer/_stream produce when nothing was retrieved; as before
+# coalescing, those turns are not remembered (checked by identity, since an
+# LLM answer may carry the same text)
+_NO_CONTEXT={"answer":NO_INFO_ANSWER}
+_NO_CONTEXT_DONE={}
+
+# raw words, stopwords included, and the ones that make a query a question
+_WORD=re.compile(r"[a-z0-9]+")
+_QUESTION_WORDS=frozenset("what which who whom whose when where why how is are was were do does did can could should would will".split())
+
+# words that point back at an earlier turn ("what are its side effects?")
+_FOLLOW_UP=re.compile(r"\b(it|its|they|them|their|this|that|these|those|he|she|his|her|same)\b",re.I)
+
+cache_collector("query_embeddings",embedding_cache)
+cache_collector("answers",answer_cache)
+
+# identical questions asked while one is being answered wait for that answer
+answer_flight=SingleFlight("answer")
+stream_flight=SingleFlight("stream")
+flight_collector(answer_flight,stream_flight)
+
+
+def flight_key(query:str,user_role:str):
+    return user_role,normalize_query(query)
+
+
+def embed_queries(texts:list)->list:
+    return embed_model.get().embed_documents(texts,task_type="RETRIEVAL_QUERY")
+
+
+# concurrent cache misses share one embedding round trip
+query_batcher=EmbeddingBatcher(embed_queries,run=embed_limiter.run)
+
+
+async def embed_query(query:str):
+    embedding=await off_loop(embedding_cache.get,EMBED_MODEL_NAME,query)
+    if embedding is None:
+        with timed("embed"):
+            embedding=await query_batcher.embed(query)
+        await off_loop(embedding_cache.put,EMBED_MODEL_NAME,query,embedding)
+    return embedding
+
+
+def lexical_fast_path(query:str,user_role:str,lexical_matches:list)->bool:
+    """Short keyword lookups (drug or condition names) that BM25 matches
+    confidently are answered from lexical hits without embedding the query.
+    Words are counted before stopword removal and questions never qualify."""
+    words=_WORD.findall(query.lower())
+    return (
+        len(words)<=LEXICAL_FAST_PATH_MAX_TERMS
+        and "?" not in query
+        and _QUESTION_WORDS.isdisjoint(words)
+        and lexical_index.confidence(user_role,query,lexical_matches)>=LEXICAL_FAST_PATH_SCORE
+    )
+
+
+async def embed_batch(queries:list)->list:
+    """Embeddings for many queries; cache misses share one embed_documents call."""
+    vectors=await off_loop(lambda:[embedding_cache.get(EMBED_MODEL_NAME,q) for q in queries])
+    missing=list(dict.fromkeys(q for q,v in zip(queries,vectors) if v is None))
+    if missing:
+        with timed("embed_batch"):
+            fresh=dict(zip(missing,await embed_limiter.run(embed_queries,missing)))
+        await off_loop(lambda:[embedding_cache.put(EMBED_MODEL_NAME,q,v) for q,v in fresh.items()])
+        vectors=[fresh[q] if v is None else v for q,v in zip(queries,vectors)]
+    return vectors
+
+
+async def prepare_query(query:str,user_role:str,use_cache:bool=True,embedding=None):
+    """Return `(embedding, lexical_matches, cached_answer)`; embedding is None
+    on the lexical fast path, whose answers are cached by exact query. A
+    precomputed `embedding` skips embedding."""
+    lexical_matches=[]
+    if HYBRID_RETRIEVAL:
+        with timed("lexical_search"):
+            lexical_matches=lexical_index.search(user_role,query,RAG_TOP_K)
+        if lexical_matches and lexical_fast_path(query,user_role,lexical_matches):
+            count("lexical_fast_path")
+            if not use_cache:
+                return None,lexical_matches,None
+            with timed("answer_cache"):
+                cached=await off_loop(answer_cache.get_exact,user_role,query)
+            return None,lexical_matches,cached
+
+    if embedding is None:
+        embedding=await embed_query(query)
+    if not use_cache:
+        return embedding,lexical_matches,None
+    with timed("answer_cache"):
+        cached=await off_loop(answer_cache.get,user_role,embedding)
+    return embedding,lexical_matches,cached
 
-async def answer_query(query:str,user_role:str):
 
-    embedding=await asyncio.to_thread(embed_model.embed_query,query)
-    results=await asyncio.to_thread(index.query, vector=embedding,top_k=3,include_metadata=True)
+async def retrieve_context(query:str,user_role:str,embedding,lexical_matches=()):
+    matches=list(lexical_matches)
+    if embedding is not None:
+        with timed("vector_query"):
+            results=await vector_query_limiter.run(
+                get_index().query,
+                vector=embedding,
+                top_k=RAG_TOP_K,
+                filter={"role":{"$eq":user_role}},
+                include_metadata=True
+            )
+        matches=reciprocal_rank_fusion([results["matches"],matches],RAG_TOP_K) if matches else results["matches"]
 
-    filtered_contexts=[]
-    sources=set()
+    # the index filter already enforces this; keep it as a guard
+    with timed("role_filter_and_pack"):
+        matches=[m for m in matches if m["metadata"].get("role")==user_role]
+        docs_text,sources=pack_context(matches)
 
-    for match in results["matches"]:
-        metadata=match["metadata"]
-        if metadata.get("role")== user_role:
-            filtered_contexts.append(metadata.get("text","")+"\\n")
-            sources.add(metadata.get("source"))
+    return docs_text,sources
 
 
-    if not filtered_contexts:
-        return {"answer":"No relevant info found"}
-    
-    docs_text="\\n".join(filtered_contexts)
-    final_answer=await asyncio.to_thread(rag_chain.invoke,{"question":query,"context":docs_text})
+def cache_answer(query:str,user_role:str,embedding,response:dict,generation):
+    if embedding is None:
+        answer_cache.put_exact(user_role,query,response,generation)
+    else:
+        answer_cache.put(user_role,embedding,response,generation)
 
 
-    return {
+async def load_history(query:str,username):
+    """Return `(search_query, history)`. Follow-ups are retrieved together
+    with the question they refer to and answered with the conversation
+    window; anything else is answered on its own so it can be cached."""
+    if not username or not _FOLLOW_UP.search(query):
+        return query,""
+    previous=await asyncio.to_thread(conversation_memory.last_question,username)
+    if not previous:
+        return query,""
+    history=await asyncio.to_thread(conversation_memory.history,username)
+    return f"{previous} {query}",history
+
+
+async def remember(username,query:str,answer:str):
+    if username:
+        await asyncio.to_thread(conversation_memory.append,username,query,answer)
+
+
+async def _answer(query:str,search:str,user_role:str,history:str,embedding=None):
+    # an upload finishing while this answer is built must keep it out of the cache
+    generation=await off_loop(answer_cache.generation,user_role)
+    embedding,lexical_matches,cached=await prepare_query(search,user_role,use_cache=not history,embedding=embedding)
+    if cached:
+        return cached
+
+    docs_text,sources=await retrieve_context(search,user_role,embedding,lexical_matches)
+    if not docs_text:
+        return _NO_CONTEXT
+
+    with timed("llm"):
+        final_answer=await llm_limiter.run(
+            rag_chain().invoke,{"question":query,"context":docs_text,"history":history or " none"}
+        )
+
+
+    response={
         "answer":final_answer.content,
-        "sources":list(sources)
-    }
\ No newline at end of file
+        "sources":sources
+    }
+    # answers that depend on one user's conversation are not shared
+    if not history:
+        await off_loop(cache_answer,search,user_role,embedding,response,generation)
+    return response
+
+
+async def answer_query(query:str,user_role:str,username:str=None,embedding=None):
+
+    search,history=await load_history(query,username)
+    if history:
+        response=await _answer(query,search,user_role,history,embedding)
+    else:
+        response=await answer_flight.do(
+            flight_key(query,user_role),lambda:_answer(query,query,user_role,"",embedding)
+        )
+    if response is not _NO_CONTEXT:
+        await remember(username,query,response["answer"])
+    return dict(response)
+
+
+async def answer_batch(queries:list,user_role:str,parallelism:int=BATCH_PARALLELISM):
+    """Yield `(index, response)` as each question is answered, in completion
+    order; `response` is the exception when that question failed.
+
+    Questions are embedded together, then at most `parallelism` of them are
+    retrieved and answered at once, so one batch never holds more than that
+    many places in the shared stage queues. Each question gets the normal
+    request deadline from when its turn starts. Batch questions are answered
+    independently of the user's conversation history.
+    """
+    embeddings=await embed_batch(queries)
+    gate=asyncio.Semaphore(parallelism)
+
+    async def one(i):
+        try:
+            async with gate:
+                start_deadline()
+                return i,await answer_query(queries[i],user_role,embedding=embeddings[i])
+        except Exception as e:
+            return i,e
+
+    tasks=[asyncio.create_task(one(i)) for i in range(len(queries))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _stream(query:str,search:str,user_role:str,history:str):
+    generation=await off_loop(answer_cache.generation,user_role)
+    embedding,lexical_matches,cached=await prepare_query(search,user_role,use_cache=not history)
+    if cached:
+        yield "sources",{"sources":cached.get("sources",[])}
+        yield "token",{"text":cached["answer"]}
+        yield "done",{}
+        return
+
+    docs_text,sources=await retrieve_context(search,user_role,embedding,lexical_matches)
+    yield "sources",{"sources":sources}
+    if not docs_text:
+        yield "token",{"text":NO_INFO_ANSWER}
+        yield "done",_NO_CONTEXT_DONE
+        return
+
+    parts=[]
+    with timed("llm_stream"):
+        async with llm_limiter.slot():
+            async for chunk in rag_chain().astream({"question":query,"context":docs_text,"history":history or " none"}):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield "token",{"text":chunk.content}
+
+    if not history:
+        await off_loop(cache_answer,search,user_role,embedding,{"answer":"".join(parts),"sources":sources},generation)
+    yield "done",{}
+
+
+async def stream_answer(query:str,user_role:str,username:str=None):
+    """Yield `(event, data)` pairs: the sources first, then answer tokens as
+    the LLM produces them, then `done`."""
+
+    search,history=await load_history(query,username)
+    if history:
+        events=_stream(query,search,user_role,history)
+    else:
+        events=stream_flight.stream(flight_key(query,user_role),lambda:_stream(query,query,user_role,""))
+
+    parts=[]
+    async with aclosing(events):
+        async for event,data in events:
+            if event=="token":
+                parts.append(data["text"])
+            elif event=="done" and data is not _NO_CONTEXT_DONE:
+                await remember(username,query,"".join(parts))
+            yield event,data
@@ -0,0 +1,106 @@
+import os
+import re
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+CONTEXT_MIN_SCORE = float(os.getenv("CONTEXT_MIN_SCORE", 0.35))  # dense similarity; lexical hits are exempt
+NEAR_DUPLICATE_CONTAINMENT = 0.8
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 200
+
+_CHUNK_NO = re.compile(r"-(\d+)$")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; avoids loading a tokenizer
+    return max(1, len(text) // 4)
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    return {" ".join(words[i:i + 5]) for i in range(max(1, len(words) - 4))}
+
+
+def _chunk_no(match: dict):
+    found = _CHUNK_NO.search(match["id"])
+    return int(found.group(1)) if found else 0
+
+
+class _Segment:
+    def __init__(self, match: dict, rank: int):
+        meta = match["metadata"]
+        self.source = meta.get("source")
+        self.page = meta.get("page")
+        self.text = meta.get("text", "")
+        self.rank = rank
+
+
+def _merge_page(matches: list) -> list:
+    """Join chunks of one page whose texts overlap (the splitter's
+    chunk_overlap) into single segments, best rank wins."""
+    segments = []
+    for rank, match in sorted(matches, key=lambda rm: _chunk_no(rm[1])):
+        text = match["metadata"].get("text", "")
+        last = segments[-1] if segments else None
+        size = _overlap(last.text, text) if last else 0
+        if size:
+            last.text += text[size:]
+            last.rank = min(last.rank, rank)
+        elif last is None or text not in last.text:
+            segments.append(_Segment(match, rank))
+    return segments
+
+
+def pack_context(matches: list, token_budget: int = CONTEXT_TOKEN_BUDGET, min_score: float = CONTEXT_MIN_SCORE):
+    """Turn retrieved matches into prompt context.
+
+    Low-similarity dense matches are dropped, overlapping chunks from the
+    same page are merged, near-duplicate segments are removed, and segments
+    are added best-first until `token_budget` is reached.
+
+    Returns `(context_text, sources)`.
+    """
+    ranked = [
+        (rank, m) for rank, m in enumerate(matches)
+        if m.get("metadata", {}).get("text") and (m.get("lexical") or m.get("score", 0.0) >= min_score)
+    ]
+
+    by_page = {}
+    for rank, match in ranked:
+        meta = match["metadata"]
+        by_page.setdefault((meta.get("source"), meta.get("page")), []).append((rank, match))
+    segments = sorted((seg for group in by_page.values() for seg in _merge_page(group)), key=lambda s: s.rank)
+
+    parts, sources, seen = [], [], []
+    remaining = token_budget
+    for seg in segments:
+        shingles = _shingles(seg.text)
+        # mostly contained in something already packed: a near duplicate
+        if any(len(shingles & other) / len(shingles) >= NEAR_DUPLICATE_CONTAINMENT for other in seen):
+            continue
+        header = f"[{seg.source}, page {seg.page}]" if seg.page is not None else f"[{seg.source}]"
+        cost = estimate_tokens(header) + estimate_tokens(seg.text)
+        text = seg.text
+        if cost > remaining:
+            # keep a truncated tail segment only if it is still worth reading
+            room = (remaining - estimate_tokens(header)) * 4
+            if room < 200:
+                break
+            text = text[:room].rsplit(" ", 1)[0] + " ..."
+            cost = remaining
+        parts.append(f"{header}\n{text}")
+        seen.append(shingles)
+        remaining -= cost
+        if seg.source not in sources:
+            sources.append(seg.source)
+        if remaining <= 0:
+            break
+
+    return "\n\n".join(parts), sources
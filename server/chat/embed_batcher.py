@@ -0,0 +1,62 @@
+import os
+import asyncio
+
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", 5))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", 32))
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests.
+
+    Texts arriving within `window_ms` of the first pending one (or until
+    `max_batch` are waiting) are sent as one `embed_many(texts)` call from a
+    worker thread, and each caller gets its own vector back. Identical texts
+    in a batch are embedded once. `run(fn, texts)` executes the blocking
+    call; it defaults to `asyncio.to_thread`.
+    """
+
+    def __init__(self, embed_many, window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_BATCH_MAX, run=None):
+        self.embed_many = embed_many
+        self.run = run or asyncio.to_thread
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []  # (text, future)
+        self._timer = None
+        self._tasks = set()  # the loop only keeps weak references to tasks
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, text: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.texts += len(texts)
+        try:
+            vectors = dict(zip(texts, await self.run(self.embed_many, texts)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if not future.done():
+                future.set_result(vectors[text])
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import atexit
+import threading
+from array import array
+from collections import OrderedDict
+from config.shared_state import shared_state
+
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 2048))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", 7 * 24 * 3600))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")  # e.g. ./user_memory/embed_cache.json
+EMBED_CACHE_FLUSH_EVERY = int(os.getenv("EMBED_CACHE_FLUSH_EVERY", 20))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings keyed on (model name, normalized query).
+
+    With `shared` set, misses fall through to a SQLite table that every worker
+    writes to, so one worker's embeddings warm the others.
+    """
+
+    def __init__(self, max_size: int = EMBED_CACHE_SIZE, ttl: float = EMBED_CACHE_TTL, path: str = EMBED_CACHE_PATH,
+                 shared=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.shared = shared
+        self._shared_puts = 0
+        self._entries = OrderedDict()  # "model\x00query" -> (created_at, vector)
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._load()
+            atexit.register(self.flush)
+        if shared:
+            shared.schema(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, created REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+
+    @staticmethod
+    def _key(model: str, query: str) -> str:
+        return f"{model}\x00{normalize_query(query)}"
+
+    def get(self, model: str, query: str):
+        key = self._key(model, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        entry = self._get_shared(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self.hits += 1
+            return entry[1]
+
+    def _get_shared(self, key: str):
+        if not self.shared:
+            return None
+        rows = self.shared.execute(
+            "SELECT created, vector FROM query_embeddings WHERE key = ? AND created > ?", (key, time.time() - self.ttl)
+        )
+        if not rows:
+            return None
+        vector = array("f")
+        vector.frombytes(rows[0][1])
+        return rows[0][0], vector.tolist()
+
+    def _put_shared(self, key: str, created_at: float, vector):
+        self._shared_puts += 1
+        with self.shared.transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?)",
+                (key, created_at, array("f", vector).tobytes()),
+            )
+            if self._shared_puts % EMBED_CACHE_FLUSH_EVERY == 0:
+                db.execute("DELETE FROM query_embeddings WHERE created < ?", (time.time() - self.ttl,))
+                db.execute(
+                    "DELETE FROM query_embeddings WHERE key IN "
+                    "(SELECT key FROM query_embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,),
+                )
+
+    def put(self, model: str, query: str, vector):
+        if self.max_size <= 0:
+            return
+        key = self._key(model, query)
+        created_at = time.time()
+        if self.shared:
+            self._put_shared(key, created_at, vector)
+        with self._lock:
+            self._entries[key] = (created_at, list(vector))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty += 1
+            flush = self.path and self._dirty >= EMBED_CACHE_FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, created_at, vector in rows[-self.max_size:]:
+            if now - created_at <= self.ttl:
+                self._entries[key] = (created_at, vector)
+
+    def flush(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [[k, created_at, v] for k, (created_at, v) in self._entries.items()]
+            self._dirty = 0
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp, self.path)
+
+
+embedding_cache = EmbeddingCache(shared=shared_state)
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from chat.context import estimate_tokens
+from chat.embed_cache import normalize_query
+
+MEMORY_DIR = os.getenv("MEMORY_DIR", "./user_memory")
+MEMORY_RING_SIZE = int(os.getenv("MEMORY_RING_SIZE", 20))  # recent turns kept in memory per user
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 400))  # history share of the prompt
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", 120))
+MEMORY_COMPACT_EVERY = int(os.getenv("MEMORY_COMPACT_EVERY", 100))  # appended lines before the log is rewritten
+MEMORY_SUMMARIZE = os.getenv("MEMORY_SUMMARIZE", "false").lower() == "true"  # LLM summary instead of a topic list
+MEMORY_MAX_USERS = int(os.getenv("MEMORY_MAX_USERS", 1000))
+MAX_TURN_CHARS = 600
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+class _Conversation:
+    def __init__(self):
+        self.turns = deque()  # {"t", "q", "a"}, at most MEMORY_RING_SIZE
+        self.summary = ""
+        self.unfolded = []  # evicted turns not yet in the summary
+        self.folding = None  # turns being folded right now
+        self.lines = 0  # lines in the log file
+        self.stat = None  # (size, mtime) of the log as this process last saw it
+
+
+class ConversationMemory:
+    """Per-user chat history as an append-only JSONL log plus a ring buffer.
+
+    Each turn is one appended line, so writing costs the same however long
+    the conversation gets. Turns that fall out of the ring are folded into a
+    short summary (a list of earlier questions, or an LLM summary when
+    MEMORY_SUMMARIZE is set), and once MEMORY_COMPACT_EVERY lines have been
+    appended the log is rewritten as the summary followed by the ring.
+    Consecutive repeats of the same question and answer are not stored.
+    """
+
+    def __init__(self, path: str = MEMORY_DIR, summarize=None):
+        self.path = path
+        self.summarize = summarize  # callable(summary, turns) -> str
+        self._users = {}  # username -> _Conversation, least recently used first
+        self._lock = threading.Lock()
+
+    def _file(self, username: str) -> str:
+        # hashed, not sanitized: "dr smith" and "dr_smith" must not share a log
+        return os.path.join(self.path, f"{hashlib.sha256(username.encode('utf-8')).hexdigest()}.jsonl")
+
+    def _stat(self, username: str):
+        try:
+            st = os.stat(self._file(username))
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _load(self, username: str) -> _Conversation:
+        conv = self._users.pop(username, None)
+        if conv is not None and conv.stat != self._stat(username):
+            conv = None  # another worker appended to this user's log
+        if conv is None:
+            conv = _Conversation()
+            turns = []
+            try:
+                with open(self._file(username), "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # torn final line from a crash
+                        conv.lines += 1
+                        if "summary" in record:
+                            conv.summary = record["summary"]
+                        else:
+                            turns.append(record)
+            except OSError:
+                pass
+            conv.unfolded = turns[:-MEMORY_RING_SIZE]
+            conv.turns.extend(turns[-MEMORY_RING_SIZE:])
+            conv.stat = self._stat(username)
+        self._users[username] = conv
+        while len(self._users) > MEMORY_MAX_USERS:
+            self._users.pop(next(iter(self._users)))
+        return conv
+
+    def _push(self, conv: _Conversation, turn: dict):
+        conv.turns.append(turn)
+        if len(conv.turns) > MEMORY_RING_SIZE:
+            # evict half the ring at once so an LLM summarizer runs every few turns, not every turn
+            conv.unfolded.extend(conv.turns.popleft() for _ in range(max(1, MEMORY_RING_SIZE // 2)))
+
+    def _settle(self, conv: _Conversation):
+        """Fold evicted turns into the summary. Called without the lock held,
+        since an LLM summarizer can take seconds and the lock is shared by
+        every user; only one fold per conversation runs at a time."""
+        while True:
+            with self._lock:
+                if conv.folding is not None or not conv.unfolded:
+                    return
+                summary, turns, conv.unfolded = conv.summary, conv.unfolded, []
+                conv.folding = turns
+            try:
+                summary = self._fold(summary, turns)
+            except BaseException:
+                with self._lock:
+                    conv.unfolded[:0] = turns
+                    conv.folding = None
+                raise
+            with self._lock:
+                conv.summary = summary
+                conv.folding = None
+
+    def _fold(self, summary: str, turns: list) -> str:
+        if self.summarize:
+            try:
+                return _clip(self.summarize(summary, turns), MEMORY_SUMMARY_TOKENS * 4)
+            except Exception as e:
+                print(f"⚠️ History summarization failed: {e}")
+        # keep the most recent topics that fit
+        topics = [t for t in summary.removeprefix("Earlier questions: ").split("; ") if t]
+        topics += [_clip(t["q"], 80) for t in turns]
+        while topics and estimate_tokens("Earlier questions: " + "; ".join(topics)) > MEMORY_SUMMARY_TOKENS:
+            topics.pop(0)
+        return "Earlier questions: " + "; ".join(topics) if topics else ""
+
+    def append(self, username: str, question: str, answer: str):
+        turn = {"t": time.time(), "q": question, "a": _clip(answer, MAX_TURN_CHARS)}
+        with self._lock:
+            conv = self._load(username)
+            last = conv.turns[-1] if conv.turns else None
+            if last and normalize_query(last["q"]) == normalize_query(question) and last["a"] == turn["a"]:
+                return
+            self._push(conv, turn)
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._file(username), "a", encoding="utf-8") as f:
+                f.write(json.dumps(turn) + "\n")
+            conv.lines += 1
+            if conv.lines >= len(conv.turns) + MEMORY_COMPACT_EVERY:
+                self._compact(username, conv)
+            conv.stat = self._stat(username)
+        self._settle(conv)
+
+    def _compact(self, username: str, conv: _Conversation):
+        # turns still being folded stay as turns; the next load folds them again
+        records = ([{"summary": conv.summary}] if conv.summary else []) + (conv.folding or []) + conv.unfolded + list(conv.turns)
+        path = self._file(username)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(r) + "\n" for r in records)
+        os.replace(tmp, path)
+        conv.lines = len(records)
+
+    def history(self, username: str, token_budget: int = MEMORY_TOKEN_BUDGET) -> str:
+        """Most recent turns that fit in `token_budget`, oldest first, preceded
+        by the summary of everything older when it still fits."""
+        with self._lock:
+            conv = self._load(username)
+        self._settle(conv)
+        with self._lock:
+            turns, summary = list(conv.turns), conv.summary
+
+        parts, remaining = [], token_budget
+        for turn in reversed(turns):
+            text = f"User: {turn['q']}\nAssistant: {turn['a']}"
+            cost = estimate_tokens(text)
+            if cost > remaining:
+                break
+            parts.append(text)
+            remaining -= cost
+        if summary and estimate_tokens(summary) <= remaining:
+            parts.append(summary)
+        return "\n".join(reversed(parts))
+
+    def last_question(self, username: str):
+        with self._lock:
+            conv = self._load(username)
+            return conv.turns[-1]["q"] if conv.turns else None
+
+    def clear(self, username: str):
+        with self._lock:
+            self._users.pop(username, None)
+            try:
+                os.remove(self._file(username))
+            except OSError:
+                pass
+
+
+def _llm_summary(summary: str, turns: list) -> str:
+    from config.clients import llm
+    transcript = "\n".join(f"User: {t['q']}\nAssistant: {t['a']}" for t in turns)
+    reply = llm.get().invoke(
+        f"Summarize this conversation in at most {MEMORY_SUMMARY_TOKENS * 3 // 4} words, keeping medical "
+        f"topics and facts the user may refer back to.\n\nPrevious summary: {summary or 'none'}\n\n{transcript}"
+    )
+    return reply.content
+
+
+conversation_memory = ConversationMemory(summarize=_llm_summary if MEMORY_SUMMARIZE else None)
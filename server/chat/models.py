@@ -0,0 +1,6 @@
+from typing import List
+from pydantic import BaseModel
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    stream: bool = False
@@ -1,10 +1,84 @@
-from fastapi import APIRouter,Depends,Form
+import os
+import json
+from fastapi import APIRouter,Depends,Form,HTTPException
+from fastapi.responses import StreamingResponse
 from auth.routes import authenticate
-from chat.chat_query import answer_query
+from chat.models import BatchRequest
+from chat.chat_query import answer_query, stream_answer, answer_batch
+from chat.memory import conversation_memory
+from chat.admission import admit, OverloadedError
+
+BATCH_MAX_QUESTIONS=int(os.getenv("BATCH_MAX_QUESTIONS",100))
 
 
 router=APIRouter()
 
 @router.post("/chat")
 async def chat(user=Depends(authenticate),message:str=Form(...)):
-    return await answer_query(message,user["role"])
\ No newline at end of file
+    await admit(user)
+    return await answer_query(message,user["role"],user["username"])
+
+
+@router.post("/chat/stream")
+async def chat_stream(user=Depends(authenticate),message:str=Form(...)):
+    await admit(user)
+
+    async def events():
+        try:
+            async for event,data in stream_answer(message,user["role"],user["username"]):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except OverloadedError as e:
+            yield f"event: error\ndata: {json.dumps({'detail':str(e),'retry_after':e.retry_after})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail':str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control":"no-cache","X-Accel-Buffering":"no"}
+    )
+
+
+def batch_item(question:str,index:int,response)->dict:
+    if isinstance(response,OverloadedError):
+        return {"index":index,"question":question,"error":str(response),"retry_after":response.retry_after}
+    if isinstance(response,Exception):
+        return {"index":index,"question":question,"error":str(response) or type(response).__name__}
+    return {"index":index,"question":question,**response}
+
+
+@router.post("/chat/batch")
+async def chat_batch(req:BatchRequest,user=Depends(authenticate)):
+    questions=[q.strip() for q in req.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400,detail="questions must be a non-empty list of non-empty strings")
+    if len(questions)>BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400,detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    # one admission for the batch; answer_batch starts a deadline per question
+    await admit(user)
+
+    if not req.stream:
+        results=[None]*len(questions)
+        async for i,response in answer_batch(questions,user["role"]):
+            results[i]=batch_item(questions[i],i,response)
+        return {"results":results}
+
+    async def events():
+        try:
+            async for i,response in answer_batch(questions,user["role"]):
+                yield f"event: result\ndata: {json.dumps(batch_item(questions[i],i,response))}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail':str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control":"no-cache","X-Accel-Buffering":"no"}
+    )
+
+
+@router.delete("/chat/history")
+async def clear_history(user=Depends(authenticate)):
+    conversation_memory.clear(user["username"])
+    return {"message":"Chat history cleared"}
@@ -0,0 +1,112 @@
+import asyncio
+from metrics.registry import count, registry
+
+
+class _Call:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Stream:
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.task = None
+        self.updated = asyncio.get_running_loop().create_future()
+
+    def notify(self):
+        updated, self.updated = self.updated, asyncio.get_running_loop().create_future()
+        updated.set_result(None)
+
+
+class SingleFlight:
+    """Coalesces identical in-flight work.
+
+    The first caller for a key starts the computation; callers arriving
+    while it runs wait for the same result (or exception) instead of
+    starting their own. The computation is cancelled only when every
+    waiter has gone away. `stream` does the same for async generators:
+    late joiners replay the events produced so far, then follow live.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._streams = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    def _forget(self, table: dict, key, flight):
+        if table.get(key) is flight:
+            del table[key]
+
+    async def do(self, key, fn):
+        """Return `await fn()`, shared with concurrent callers for `key`."""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            count(f"coalesced_{self.name}")
+        call.waiters += 1
+        try:
+            # shield: one waiter being cancelled must not cancel the others' result
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+
+    async def stream(self, key, make_gen):
+        """Yield the items of `make_gen()`, shared with concurrent callers for `key`."""
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _Stream()
+            flight.task = asyncio.ensure_future(self._pump(key, flight, make_gen()))
+        else:
+            count(f"coalesced_{self.name}")
+        flight.waiters += 1
+        try:
+            seen = 0
+            while True:
+                while seen < len(flight.events):
+                    yield flight.events[seen]
+                    seen += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                # asyncio.wait leaves the shared future alone if this waiter is cancelled
+                await asyncio.wait({flight.updated})
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.done:
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+
+    async def _pump(self, key, flight: _Stream, agen):
+        try:
+            async for item in agen:
+                flight.events.append(item)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(self._streams, key, flight)
+            flight.notify()
+
+
+def flight_collector(*flights):
+    """Expose how many coalescable computations are running right now."""
+    def collect():
+        return [f'medchat_in_flight{{flight="{f.name}"}} {f.in_flight()}' for f in flights]
+    registry.collector(collect)
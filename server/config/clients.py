@@ -0,0 +1,89 @@
+import os
+import asyncio
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+EMBED_MODEL_NAME = "models/embedding-001"
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "llama3-8b-8192")
+
+
+class LazyClient:
+    """A shared client built on first use instead of at import time.
+
+    `check`, if given, is run by `warm` to verify the service is reachable
+    (e.g. a Mongo ping). `override` swaps in another instance, which is how
+    benchmarks plug in local stand-ins.
+    """
+
+    registry = []
+
+    def __init__(self, name: str, factory, check=None):
+        self.name = name
+        self.factory = factory
+        self.check = check
+        self.error = None
+        self.checked = False
+        self._instance = None
+        self._lock = threading.Lock()
+        LazyClient.registry.append(self)
+
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self.factory()
+        return self._instance
+
+    def override(self, instance):
+        with self._lock:
+            self._instance = instance
+            self.checked = instance is not None
+            self.error = None
+
+    def warm(self):
+        try:
+            instance = self.get()
+            if self.check and not self.checked:
+                self.check(instance)
+            self.checked = True
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            raise
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None and self.checked
+
+
+async def warm_up(only_missing: bool = False):
+    """Create (and check) every registered client concurrently; failures are
+    recorded on the client rather than raised."""
+    clients = [c for c in LazyClient.registry if not (only_missing and c.ready)]
+    results = await asyncio.gather(*(asyncio.to_thread(c.warm) for c in clients), return_exceptions=True)
+    for client, result in zip(clients, results):
+        if isinstance(result, Exception):
+            print(f"⚠️ {client.name} is not ready: {result}")
+
+
+def readiness() -> dict:
+    services = {c.name: ("ready" if c.ready else c.error or "not started") for c in LazyClient.registry}
+    return {"ready": all(c.ready for c in LazyClient.registry), "services": services}
+
+
+def _make_embeddings():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=EMBED_MODEL_NAME, google_api_key=GOOGLE_API_KEY)
+
+
+def _make_llm():
+    from langchain_groq import ChatGroq
+    return ChatGroq(temperature=0.3, model_name=LLM_MODEL_NAME, groq_api_key=GROQ_API_KEY)
+
+
+embed_model = LazyClient("embeddings", _make_embeddings)
+llm = LazyClient("llm", _make_llm)
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from config.clients import LazyClient
 
 load_dotenv()
 
@@ -8,8 +9,16 @@ MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME")
 appName = os.getenv("appName")
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-users_collection = db["users"]  
 
-print(f"Connected to MongoDB database: {DB_NAME} with appName: {appName}")
\ No newline at end of file
+def _connect():
+    # MongoClient connects in the background; the ping in warm-up surfaces failures
+    client = MongoClient(MONGO_URI, appname=appName, serverSelectionTimeoutMS=5000)
+    print(f"Connected to MongoDB database: {DB_NAME} with appName: {appName}")
+    return client
+
+
+mongo = LazyClient("mongo", _connect, check=lambda client: client.admin.command("ping"))
+
+
+def get_users_collection():
+    return mongo.get()[DB_NAME]["users"]
@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Set (by main.py in multi-worker mode, or by hand) to share caches, rate
+# limits and ingestion jobs between server processes on one host.
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH")
+
+
+class SharedState:
+    """One SQLite file (WAL mode) that worker processes read and write.
+
+    Each thread gets its own connection. Callers create their own tables with
+    `schema` and use `transaction` when a read-modify-write must be atomic
+    across processes (it takes SQLite's write lock up front).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self._local = threading.local()
+        with self.transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def execute(self, sql: str, params=()) -> list:
+        return self.connect().execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        db = self.connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def schema(self, *statements: str):
+        with self.transaction() as db:
+            for sql in statements:
+                db.execute(sql)
+
+    def try_lease(self, name: str, ttl: float) -> bool:
+        """Take or renew the named lease for `ttl` seconds; False while another
+        live owner holds it. A crashed owner's lease lapses after its ttl."""
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != self.owner and row[1] > now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, self.owner, now + ttl))
+        return True
+
+    def release_lease(self, name: str):
+        self.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+
+shared_state = SharedState(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
+
+
+async def off_loop(fn, *args):
+    """Await `fn(*args)`. With shared state it runs on a worker thread, since
+    it may wait on another process's SQLite write lock; in-process state is
+    quick enough to use inline."""
+    if shared_state is None:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict
+from config.shared_state import shared_state
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", 8))
+INGEST_HISTORY = int(os.getenv("INGEST_HISTORY", 100))
+JOB_HEARTBEAT = float(os.getenv("JOB_HEARTBEAT", 1.0))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", 30))  # no heartbeat for this long: the worker is gone
+INGEST_LEASE = "ingestion"
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+
+def _background(coro) -> asyncio.Task:
+    # workers are started by the first upload request; a fresh context keeps
+    # them (and the job and upsert tasks they start) from recording into
+    # that request's Server-Timing list for good
+    return contextvars.Context().run(asyncio.create_task, coro)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobExistsError(Exception):
+    pass
+
+
+class IngestionJob:
+    def __init__(self, doc_id: str, filename: str, role: str, run, file_hash: str = None):
+        self.doc_id = doc_id
+        self.filename = filename
+        self.role = role
+        self.file_hash = file_hash
+        self.run = run  # async callable taking the job's progress dict
+        self.status = QUEUED
+        self.error = None
+        self.progress = {"pages_parsed": 0, "chunks_embedded": 0, "vectors_upserted": 0}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def to_dict(self) -> dict:
+        return {
+            "doc_id": self.doc_id,
+            "filename": self.filename,
+            "accessible_to": self.role,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs ingestion jobs on a fixed pool of asyncio workers.
+
+    At most `workers` jobs run at once and at most `max_pending` wait in the
+    queue; `submit` raises QueueFullError beyond that. While a job is queued
+    or running it reserves its role's file name and file hash: `submit`
+    raises JobExistsError for a second job with either, which would
+    otherwise index the same document under another doc_id.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_pending: int = INGEST_MAX_PENDING, history: int = INGEST_HISTORY):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.history = history
+        self.jobs = OrderedDict()
+        self._queue = None
+        self._worker_tasks = []
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [t for t in self._worker_tasks if not t.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(_background(self._worker()))
+
+    def pending(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def _conflict(self, job: IngestionJob):
+        for other in self.jobs.values():
+            if other.status in FINISHED or other.role != job.role:
+                continue
+            if other.doc_id == job.doc_id or other.filename == job.filename:
+                return f"{job.filename} is already being indexed"
+            if job.file_hash is not None and other.file_hash == job.file_hash:
+                return f"{job.filename} has the same content as {other.filename}, which is being indexed"
+        return None
+
+    def submit(self, job: IngestionJob) -> IngestionJob:
+        self._ensure_workers()
+        conflict = self._conflict(job)
+        if conflict:
+            raise JobExistsError(conflict)
+        if self.pending() >= self.max_pending:
+            raise QueueFullError("Too many documents are waiting to be indexed")
+        self.jobs[job.doc_id] = job
+        self._queue.put_nowait(job)
+        self._trim()
+        return job
+
+    def get(self, doc_id: str):
+        return self.jobs.get(doc_id)
+
+    def cancel(self, doc_id: str) -> bool:
+        job = self.jobs.get(doc_id)
+        if job is None or job.status in FINISHED:
+            return False
+        if job.status == QUEUED:
+            self._finish(job, CANCELLED)
+        elif job.task is not None:
+            job.task.cancel()
+        return True
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != QUEUED or not await self._wait_turn(job):
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.task = asyncio.create_task(job.run(job.progress))
+                try:
+                    await job.task
+                    self._finish(job, COMPLETED)
+                except asyncio.CancelledError:
+                    if not job.task.cancelled():
+                        raise  # the worker itself is being shut down
+                    self._finish(job, CANCELLED)
+                except Exception as e:
+                    print(f"⚠️ Ingestion of {job.filename} failed: {e}")
+                    self._finish(job, FAILED, str(e))
+                finally:
+                    self._end_turn(job)
+            finally:
+                self._queue.task_done()
+
+    async def _wait_turn(self, job: IngestionJob) -> bool:
+        """Hook run before a queued job starts; False skips the job."""
+        return True
+
+    def _end_turn(self, job: IngestionJob):
+        pass
+
+    def _finish(self, job: IngestionJob, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.task = None
+
+    def _trim(self):
+        finished = [doc_id for doc_id, job in self.jobs.items() if job.status in FINISHED]
+        for doc_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[doc_id]
+
+
+class SharedJobManager(JobManager):
+    """JobManager for multi-worker mode, with the job table in SQLite.
+
+    A job runs in the worker that accepted the upload, but registering it is
+    atomic across workers, so one doc_id is never indexed twice at once, and
+    status, progress and cancel requests work from any worker. Jobs take
+    turns under a cross-process lease because ingestion rewrites the
+    manifest and the lexical and local indexes.
+    """
+
+    def __init__(self, shared, **kwargs):
+        super().__init__(**kwargs)
+        self.shared = shared
+        self._heartbeat_task = None
+        self._turns = 0  # local jobs running under the ingestion lease
+        shared.schema(
+            "CREATE TABLE IF NOT EXISTS jobs (doc_id TEXT PRIMARY KEY, filename TEXT, role TEXT, status TEXT, "
+            "progress TEXT, error TEXT, owner TEXT, cancel INTEGER NOT NULL DEFAULT 0, created_at REAL, "
+            "started_at REAL, finished_at REAL, heartbeat REAL, file_hash TEXT)"
+        )
+        with shared.transaction() as db:
+            # job tables created before uploads were reserved by hash
+            if "file_hash" not in {row[1] for row in db.execute("PRAGMA table_info(jobs)")}:
+                db.execute("ALTER TABLE jobs ADD COLUMN file_hash TEXT")
+
+    def _ensure_workers(self):
+        super()._ensure_workers()
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = _background(self._heartbeat())
+
+    def pending(self) -> int:
+        return self.shared.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND heartbeat > ?", (QUEUED, time.time() - JOB_STALE_AFTER)
+        )[0][0]
+
+    def _row(self, job: IngestionJob) -> tuple:
+        return (
+            job.doc_id, job.filename, job.role, job.status, json.dumps(job.progress), job.error, self.shared.owner,
+            0, job.created_at, job.started_at, job.finished_at, time.time(), job.file_hash,
+        )
+
+    def _save(self, job: IngestionJob):
+        self.shared.execute(
+            "UPDATE jobs SET status = ?, progress = ?, error = ?, started_at = ?, finished_at = ?, heartbeat = ? "
+            "WHERE doc_id = ? AND owner = ?",
+            (job.status, json.dumps(job.progress), job.error, job.started_at, job.finished_at, time.time(),
+             job.doc_id, self.shared.owner),
+        )
+
+    def submit(self, job: IngestionJob) -> IngestionJob:
+        self._ensure_workers()
+        now = time.time()
+        with self.shared.transaction() as db:
+            rows = db.execute(
+                "SELECT filename, file_hash FROM jobs WHERE status NOT IN (?, ?, ?) AND heartbeat > ? "
+                "AND (doc_id = ? OR (role = ? AND (filename = ? OR file_hash = ?)))",
+                (*FINISHED, now - JOB_STALE_AFTER, job.doc_id, job.role, job.filename, job.file_hash),
+            ).fetchall()
+            for filename, file_hash in rows:
+                if filename != job.filename and file_hash == job.file_hash:
+                    raise JobExistsError(f"{job.filename} has the same content as {filename}, which is being indexed")
+                raise JobExistsError(f"{job.filename} is already being indexed")
+            queued = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND heartbeat > ?", (QUEUED, now - JOB_STALE_AFTER)
+            ).fetchone()[0]
+            if queued >= self.max_pending:
+                raise QueueFullError("Too many documents are waiting to be indexed")
+            db.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._row(job))
+            db.execute(
+                "DELETE FROM jobs WHERE doc_id IN (SELECT doc_id FROM jobs WHERE status IN (?, ?, ?) "
+                "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (*FINISHED, self.history),
+            )
+        self.jobs[job.doc_id] = job
+        self._queue.put_nowait(job)
+        self._trim()
+        return job
+
+    def get(self, doc_id: str):
+        job = self.jobs.get(doc_id)
+        if job is not None:
+            return job
+        rows = self.shared.execute(
+            "SELECT filename, role, status, progress, error, created_at, started_at, finished_at, heartbeat, file_hash "
+            "FROM jobs WHERE doc_id = ?", (doc_id,)
+        )
+        if not rows:
+            return None
+        filename, role, status, progress, error, created_at, started_at, finished_at, heartbeat, file_hash = rows[0]
+        job = IngestionJob(doc_id, filename, role, None, file_hash)
+        job.status, job.progress, job.error = status, json.loads(progress), error
+        job.created_at, job.started_at, job.finished_at = created_at, started_at, finished_at
+        if status not in FINISHED and heartbeat < time.time() - JOB_STALE_AFTER:
+            job.status, job.error = FAILED, "The worker running this job stopped"
+        return job
+
+    def cancel(self, doc_id: str) -> bool:
+        if doc_id in self.jobs:
+            return super().cancel(doc_id)
+        now = time.time()
+        with self.shared.transaction() as db:
+            row = db.execute("SELECT status, heartbeat FROM jobs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None or row[0] in FINISHED:
+                return False
+            if row[1] < now - JOB_STALE_AFTER:
+                db.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ? WHERE doc_id = ?", (CANCELLED, now, doc_id)
+                )
+            else:
+                # the owning worker notices on its next heartbeat
+                db.execute("UPDATE jobs SET cancel = 1 WHERE doc_id = ?", (doc_id,))
+        return True
+
+    async def _wait_turn(self, job: IngestionJob) -> bool:
+        # jobs within this process share the lease, as they share the indexes
+        while job.status == QUEUED:
+            if self._turns or await asyncio.to_thread(self.shared.try_lease, INGEST_LEASE, JOB_STALE_AFTER):
+                self._turns += 1
+                return True
+            await asyncio.sleep(JOB_HEARTBEAT)
+        return False
+
+    def _end_turn(self, job: IngestionJob):
+        self._turns -= 1
+        if not self._turns:
+            self.shared.release_lease(INGEST_LEASE)
+
+    def _finish(self, job: IngestionJob, status: str, error: str = None):
+        super()._finish(job, status, error)
+        self._save(job)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT)
+            try:
+                active = [job for job in self.jobs.values() if job.status not in FINISHED]
+                for job in active:
+                    await asyncio.to_thread(self._save, job)
+                if self._turns:
+                    await asyncio.to_thread(self.shared.try_lease, INGEST_LEASE, JOB_STALE_AFTER)
+                if active:
+                    rows = await asyncio.to_thread(
+                        self.shared.execute, "SELECT doc_id FROM jobs WHERE owner = ? AND cancel = 1 AND status IN (?, ?)",
+                        (self.shared.owner, QUEUED, RUNNING),
+                    )
+                    for (doc_id,) in rows:
+                        super().cancel(doc_id)
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+
+job_manager = SharedJobManager(shared_state) if shared_state else JobManager()
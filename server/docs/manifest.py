@@ -0,0 +1,127 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+
+DOC_MANIFEST_PATH = os.getenv("DOC_MANIFEST_PATH", "./doc_manifest.json")
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentManifest:
+    """What has been indexed, per (role, filename).
+
+    Each document records its stable doc_id, the hash of the last indexed
+    file and, per page, the page text hash plus `[vector_id, chunk_hash]`
+    pairs. That is enough to skip identical uploads, leave unchanged pages
+    alone, reuse embeddings of chunks that moved, and delete stale vectors.
+    The file is re-read whenever another process has replaced it.
+    """
+
+    def __init__(self, path: str = DOC_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.documents = {}
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.documents = json.load(f)
+            self._mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _key(role: str, filename: str) -> str:
+        return f"{role}/{filename}"
+
+    def get(self, role: str, filename: str):
+        with self._lock:
+            self._refresh()
+            return self.documents.get(self._key(role, filename))
+
+    def doc_id_for(self, role: str, filename: str) -> str:
+        entry = self.get(role, filename)
+        return entry["doc_id"] if entry else str(uuid.uuid4())
+
+    def find_by_hash(self, role: str, file_hash: str):
+        with self._lock:
+            self._refresh()
+            for entry in self.documents.values():
+                if entry["role"] == role and entry["file_hash"] == file_hash:
+                    return entry
+        return None
+
+    def chunk_ids(self, role: str) -> dict:
+        """Map chunk hash -> an indexed vector id holding its embedding."""
+        with self._lock:
+            self._refresh()
+            return {
+                chunk_hash: vector_id
+                for entry in self.documents.values() if entry["role"] == role
+                for page in entry["pages"].values()
+                for vector_id, chunk_hash in page["chunks"]
+            }
+
+    def vector_ids(self) -> list:
+        """Every indexed vector id, in document and page order."""
+        with self._lock:
+            self._refresh()
+            return [
+                vector_id
+                for entry in self.documents.values()
+                for page in entry["pages"].values()
+                for vector_id, _ in page["chunks"]
+            ]
+
+    def record(self, role: str, filename: str, doc_id: str, file_hash: str, pages: dict):
+        with self._lock:
+            self._refresh()
+            self.documents[self._key(role, filename)] = {
+                "role": role,
+                "filename": filename,
+                "doc_id": doc_id,
+                "file_hash": file_hash,
+                "pages": pages,
+            }
+            self._save()
+
+    def restore(self, documents: dict, incomplete=()):
+        """Merge entries exported from another deployment's manifest. Keys in
+        `incomplete` are dropped instead, so those files are fully indexed
+        again on their next upload."""
+        with self._lock:
+            self._refresh()
+            for key in incomplete:
+                self.documents.pop(key, None)
+            self.documents.update({key: entry for key, entry in documents.items() if key not in incomplete})
+            self._save()
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.documents, f)
+        os.replace(tmp, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+
+manifest = DocumentManifest()
@@ -0,0 +1,77 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+from langchain_core.documents import Document
+
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", os.cpu_count() or 1))
+PDF_PARSE_MIN_PAGES = int(os.getenv("PDF_PARSE_MIN_PAGES", 50))  # below this, parse in-process
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 25))
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # forking a server with live threads (executors, SQLite, HTTP pools)
+        # can copy held locks into the child; forkserver children start clean
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def count_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_range(path: str, start: int, stop: int) -> list:
+    reader = PdfReader(path)
+    return [(i, reader.pages[i].extract_text()) for i in range(start, stop)]
+
+
+async def iter_pages(path):
+    """Yield one Document per page, in page order, with `source`/`page` metadata
+    matching PyPDFLoader.
+
+    Large files are split into PDF_PAGES_PER_TASK page ranges parsed in a
+    process pool; at most two ranges per worker are in flight so memory stays
+    bounded while pages are consumed.
+    """
+    path = str(path)
+    loop = asyncio.get_running_loop()
+    total = await asyncio.to_thread(count_pages, path)
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, total)) for start in range(0, total, PDF_PAGES_PER_TASK)]
+
+    if PDF_PARSE_WORKERS <= 1 or total < PDF_PARSE_MIN_PAGES:
+        def submit(start, stop):
+            return asyncio.ensure_future(asyncio.to_thread(extract_range, path, start, stop))
+        window = 1
+    else:
+        executor = _get_executor()
+
+        def submit(start, stop):
+            return loop.run_in_executor(executor, extract_range, path, start, stop)
+        window = PDF_PARSE_WORKERS * 2
+
+    in_flight = [submit(*r) for r in ranges[:window]]
+    pending = ranges[window:]
+    try:
+        while in_flight:
+            pages = await in_flight.pop(0)
+            if pending:
+                in_flight.append(submit(*pending.pop(0)))
+            for page_no, text in pages:
+                yield Document(page_content=text, metadata={"source": path, "page": page_no})
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -1,23 +1,81 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from auth.routes import authenticate
-from docs.vectorstore import load_vectorstore
-import uuid
+from docs.vectorstore import index_document
+from docs.uploads import receive_upload, UploadTooLargeError, UploadFormError
+from docs.jobs import job_manager, IngestionJob, QueueFullError, JobExistsError
+from docs.manifest import manifest
 
 router = APIRouter()
 
-@router.post("/upload_docs")
-async def upload_docs(
-    user=Depends(authenticate),
-    file: UploadFile = File(...),
-    role: str = Form(...)
-):
+
+def require_admin(user=Depends(authenticate)):
     if user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admin can upload files")
+    return user
+
+
+# the body is parsed by receive_upload, not FastAPI, so describe it here
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file", "role"],
+            "properties": {"file": {"type": "string", "format": "binary"}, "role": {"type": "string"}},
+        }}},
+    }
+}
+
+
+@router.post("/upload_docs", status_code=202, openapi_extra=UPLOAD_FORM_SCHEMA)
+async def upload_docs(request: Request, user=Depends(require_admin)):
+    if job_manager.pending() >= job_manager.max_pending:
+        raise HTTPException(status_code=429, detail="Too many documents are waiting to be indexed")
+
+    try:
+        fields, upload = await receive_upload(request)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    role = fields.get("role")
+    if upload is None or not role:
+        raise HTTPException(status_code=400, detail="Send a PDF as `file` and the target `role`")
+    filename, save_path, file_hash = upload.filename, upload.path, upload.file_hash
 
-    doc_id = str(uuid.uuid4())
-    await load_vectorstore([file], role, doc_id)  # ✅ AWAIT here
+    # re-uploads of the same file name for a role keep their doc_id
+    doc_id = manifest.doc_id_for(role, filename)
+
+    async def run(progress):
+        failed_ids = await index_document(save_path, filename, role, doc_id, progress, file_hash)
+        if failed_ids:
+            raise RuntimeError(f"{len(failed_ids)} vectors could not be upserted")
+
+    try:
+        job = job_manager.submit(IngestionJob(doc_id, filename, role, run, file_hash))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except JobExistsError as e:
+        # the same file name or content is already queued or running
+        raise HTTPException(status_code=409, detail=str(e))
     return {
-        "message": f"{file.filename} uploaded successfully",
+        "message": f"{filename} queued for indexing",
         "doc_id": doc_id,
-        "accessible_to": role
+        "accessible_to": role,
+        "status": job.status
     }
+
+
+@router.get("/upload_docs/{doc_id}/status")
+async def upload_status(doc_id: str, user=Depends(require_admin)):
+    job = job_manager.get(doc_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown doc_id")
+    return job.to_dict()
+
+
+@router.post("/upload_docs/{doc_id}/cancel")
+async def cancel_upload(doc_id: str, user=Depends(require_admin)):
+    if not job_manager.cancel(doc_id):
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return job_manager.get(doc_id).to_dict()
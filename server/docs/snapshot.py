@@ -0,0 +1,218 @@
+"""Export the indexed corpus to a snapshot and restore it into any backend.
+
+A snapshot is a directory holding:
+
+    embeddings.npy  one row per chunk, float16 or float32, memory-mappable
+    columns.json    ids plus source/doc_id/role/page/text columns, row-aligned
+    manifest.json   the document manifest, so re-uploads stay incremental
+
+Restoring upserts the stored embeddings and rebuilds the BM25 index without
+parsing or embedding anything. From the server directory:
+
+    python -m docs.snapshot export ./snapshots/2026-10-18 --dtype float16
+    VECTOR_BACKEND=local python -m docs.snapshot import ./snapshots/2026-10-18
+"""
+import os
+import json
+import asyncio
+import argparse
+import numpy as np
+from config.clients import EMBED_MODEL_NAME
+from chat.answer_cache import answer_cache
+from docs.manifest import manifest
+from vectordb import get_index, EMBED_DIM
+from vectordb.lexical import lexical_index
+from vectordb.local_store import META_COLUMNS
+from vectordb.upsert import BatchUpserter, UPSERT_PARALLELISM
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FETCH_BATCH = int(os.getenv("SNAPSHOT_FETCH_BATCH", 200))  # ids per fetch request
+SNAPSHOT_FETCH_PARALLELISM = int(os.getenv("SNAPSHOT_FETCH_PARALLELISM", 4))
+SNAPSHOT_UPSERT_ROWS = 1000  # rows read from the memmap per submit
+
+EMBEDDINGS_FILE = "embeddings.npy"
+COLUMNS_FILE = "columns.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def _write_json(path: str, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+async def export_snapshot(path: str, index=None, dtype: str = "float16",
+                          batch_size: int = SNAPSHOT_FETCH_BATCH, parallelism: int = SNAPSHOT_FETCH_PARALLELISM) -> dict:
+    """Write every vector in `index` to `path`.
+
+    Ids are listed from the index itself, so vectors the local manifest does
+    not know about are exported too; the result counts those (`unlisted`)
+    and manifest ids the index lacks (`missing`). Ids are fetched in batches,
+    `parallelism` requests at a time, and rows are written in manifest order
+    (unlisted ids last) straight into the `.npy` memmap.
+    """
+    index = index or get_index()
+    stored = set(await asyncio.to_thread(index.list_ids))
+    if not stored:
+        raise ValueError("The vector index is empty; check VECTOR_BACKEND and the index settings")
+    known = manifest.vector_ids()
+    listed = set(known)
+    ids = [vid for vid in known if vid in stored] + sorted(stored - listed)
+    os.makedirs(path, exist_ok=True)
+    batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+    partial = os.path.join(path, f"{EMBEDDINGS_FILE}.partial")
+
+    exported = []
+    columns = {name: [] for name in META_COLUMNS}
+    embeddings = None
+
+    def fetch(batch):
+        return batch, asyncio.ensure_future(asyncio.to_thread(index.fetch, batch))
+
+    in_flight = [fetch(b) for b in batches[:parallelism]]
+    pending = batches[parallelism:]
+    try:
+        while in_flight:
+            batch, future = in_flight.pop(0)
+            found = await future
+            if pending:
+                in_flight.append(fetch(pending.pop(0)))
+            for vid in batch:
+                if vid not in found:
+                    continue
+                values, metadata = found[vid]
+                if embeddings is None:
+                    embeddings = np.lib.format.open_memmap(
+                        partial, mode="w+", dtype=np.dtype(dtype), shape=(len(ids), len(values))
+                    )
+                embeddings[len(exported)] = values
+                exported.append(vid)
+                for name in META_COLUMNS:
+                    columns[name].append(metadata.get(name))
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+    dim = embeddings.shape[1] if embeddings is not None else EMBED_DIM
+    final = os.path.join(path, EMBEDDINGS_FILE)
+    out = np.lib.format.open_memmap(final, mode="w+", dtype=np.dtype(dtype), shape=(len(exported), dim))
+    if embeddings is not None:
+        out[:] = embeddings[:len(exported)]
+        del embeddings
+        os.remove(partial)
+    out.flush()
+    del out
+
+    _write_json(os.path.join(path, COLUMNS_FILE), {
+        "version": SNAPSHOT_VERSION,
+        "embed_model": EMBED_MODEL_NAME,
+        "dim": dim,
+        "dtype": np.dtype(dtype).name,
+        "ids": exported,
+        "columns": columns,
+    })
+    _write_json(os.path.join(path, MANIFEST_FILE), manifest.documents)
+    return {
+        "exported": len(exported),
+        "missing": len(listed - set(exported)),
+        "unlisted": sum(1 for vid in exported if vid not in listed),
+    }
+
+
+def _rows(embeddings, meta: dict, start: int, stop: int) -> list:
+    columns = meta["columns"]
+    block = np.asarray(embeddings[start:stop], dtype=np.float32)
+    rows = []
+    for offset, row in enumerate(range(start, stop)):
+        metadata = {name: columns[name][row] for name in META_COLUMNS if columns[name][row] is not None}
+        rows.append((meta["ids"][row], block[offset].tolist(), metadata))
+    return rows
+
+
+async def import_snapshot(path: str, index=None, parallelism: int = UPSERT_PARALLELISM, force: bool = False) -> dict:
+    """Upsert a snapshot into `index` (the configured backend by default),
+    rebuild the lexical index for it and merge its manifest. Cached answers
+    for the imported roles are dropped.
+
+    Refuses snapshots from another embedding model or dimension unless
+    `force` is set, since their vectors would not match query embeddings.
+    """
+    index = index or get_index()
+    with open(os.path.join(path, COLUMNS_FILE), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {meta.get('version')}")
+    if not force and (meta["embed_model"] != EMBED_MODEL_NAME or meta["dim"] != EMBED_DIM):
+        raise ValueError(
+            f"Snapshot was embedded with {meta['embed_model']} ({meta['dim']}d); "
+            f"this server uses {EMBED_MODEL_NAME} ({EMBED_DIM}d)"
+        )
+    embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+
+    upserter = BatchUpserter(index, parallelism=parallelism)
+    for start in range(0, len(meta["ids"]), SNAPSHOT_UPSERT_ROWS):
+        rows = _rows(embeddings, meta, start, min(start + SNAPSHOT_UPSERT_ROWS, len(meta["ids"])))
+        await upserter.submit(rows)
+        by_role = {}
+        for row in rows:
+            by_role.setdefault(row[2].get("role"), []).append(row)
+        for role, role_rows in by_role.items():
+            lexical_index.add(role, role_rows)
+    failed_ids = await upserter.drain()
+
+    lexical_index.delete(failed_ids)
+    lexical_index.flush()
+    index.flush()
+    incomplete = set()
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            documents = json.load(f)
+    except OSError:
+        print("⚠️ Snapshot has no manifest; re-uploads will be indexed from scratch")
+    else:
+        failed = set(failed_ids)
+        incomplete = {
+            key for key, entry in documents.items()
+            if any(vector_id in failed for page in entry["pages"].values() for vector_id, _ in page["chunks"])
+        }
+        manifest.restore(documents, incomplete)
+        for key in incomplete:
+            print(f"⚠️ {documents[key]['filename']} was only partly imported; upload it again to index it")
+    for role in set(meta["columns"]["role"]):
+        answer_cache.invalidate_role(role)
+    return {"imported": upserter.upserted, "failed_ids": failed_ids, "incomplete": len(incomplete)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the indexed corpus to a snapshot directory")
+    export.add_argument("path")
+    export.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    export.add_argument("--parallelism", type=int, default=SNAPSHOT_FETCH_PARALLELISM)
+    restore = commands.add_parser("import", help="upsert a snapshot into the configured vector backend")
+    restore.add_argument("path")
+    restore.add_argument("--parallelism", type=int, default=UPSERT_PARALLELISM)
+    restore.add_argument("--force", action="store_true", help="import even if the embedding model differs")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            result = asyncio.run(export_snapshot(args.path, dtype=args.dtype, parallelism=args.parallelism))
+        else:
+            result = asyncio.run(import_snapshot(args.path, parallelism=args.parallelism, force=args.force))
+    except ValueError as e:
+        parser.exit(1, f"❌ {e}\n")
+    if args.command == "export":
+        if result["missing"]:
+            print(f"⚠️ {result['missing']} vectors in the manifest are not in the index")
+        if result["unlisted"]:
+            print(f"⚠️ {result['unlisted']} exported vectors belong to no document in the manifest")
+        print(f"✅ Exported {result['exported']} vectors to {args.path}")
+    else:
+        print(f"✅ Imported {result['imported']} vectors from {args.path} ({len(result['failed_ids'])} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Storing uploaded PDFs.
+
+`receive_upload` parses the multipart request body as it arrives and writes
+the file part in chunks (on a worker thread) straight into UPLOAD_DIR,
+hashing it on the way, so the file is neither held in memory nor spooled
+and copied again. UPLOAD_MAX_BYTES is checked against Content-Length before
+anything is read and again while streaming.
+
+Files are stored as `<sha256><ext>`, so uploads with the same name never
+overwrite each other and identical uploads share one file. They are kept
+after indexing as the source documents; remove them by hand if disk space
+matters, since re-uploads are matched against the manifest, not these files.
+"""
+import os
+import asyncio
+import hashlib
+import tempfile
+from pathlib import Path
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from metrics.registry import timed
+
+UPLOAD_DIR = "./uploaded_docs"
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 100 * 1024 * 1024))
+FORM_FIELD_MAX_BYTES = 64 * 1024  # non-file fields; also the allowance for multipart framing
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Uploads are limited to {max_bytes / (1024 * 1024):.1f} MB")
+
+
+class UploadFormError(Exception):
+    pass
+
+
+class StoredUpload:
+    def __init__(self, filename: str, path: Path, file_hash: str, size: int):
+        self.filename = filename
+        self.path = path
+        self.file_hash = file_hash
+        self.size = size
+
+
+class _UploadWriter:
+    """Writes one file into UPLOAD_DIR under a temporary name, hashing it as
+    it goes; `commit` renames it after its sha256."""
+
+    def __init__(self, filename: str, max_bytes: int):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._out = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=".partial", delete=False)
+
+    def write(self, block: bytes):
+        self.size += len(block)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(self.max_bytes)
+        self._digest.update(block)
+        self._out.write(block)
+
+    def commit(self) -> StoredUpload:
+        self._out.close()
+        file_hash = self._digest.hexdigest()
+        path = Path(UPLOAD_DIR) / f"{file_hash}{Path(self.filename).suffix.lower()}"
+        # identical content lands on the same name, so replacing is harmless
+        os.replace(self._out.name, path)
+        return StoredUpload(self.filename, path, file_hash, self.size)
+
+    def discard(self):
+        self._out.close()
+        try:
+            os.remove(self._out.name)
+        except FileNotFoundError:
+            pass
+
+
+class _FormReader:
+    """python-multipart callbacks collecting text fields and writing the one
+    file part through an _UploadWriter."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.fields = {}
+        self.upload = None
+        self.writer = None
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._name = ""
+        self._data = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._data = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise UploadFormError("Every form part needs a name")
+        self._name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            if self.writer is not None or self.upload is not None:
+                raise UploadFormError("Upload one file at a time")
+            self.writer = _UploadWriter(options[b"filename"].decode("utf-8", "replace"), self.max_bytes)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.writer is not None:
+            self.writer.write(data[start:end])
+            return
+        self._data += data[start:end]
+        if len(self._data) > FORM_FIELD_MAX_BYTES:
+            raise UploadFormError(f"Form field {self._name} is too large")
+
+    def on_part_end(self):
+        if self.writer is not None:
+            self.upload, self.writer = self.writer.commit(), None
+        else:
+            self.fields[self._name] = self._data.decode("utf-8", "replace")
+
+
+async def receive_upload(request, max_bytes: int = UPLOAD_MAX_BYTES):
+    """Parse a multipart upload from `request`'s body stream.
+
+    Returns `(fields, upload)`: the text fields and the StoredUpload, or None
+    when the form has no file. Raises UploadTooLargeError and UploadFormError.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + FORM_FIELD_MAX_BYTES:
+        raise UploadTooLargeError(max_bytes)
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadFormError("Expected a multipart/form-data upload")
+
+    form = _FormReader(max_bytes)
+    parser = MultipartParser(params[b"boundary"], form.callbacks())
+    try:
+        with timed("upload_write"):
+            async for chunk in request.stream():
+                # the callbacks write to disk, so feed the parser off the event loop
+                await asyncio.to_thread(parser.write, chunk)
+            await asyncio.to_thread(parser.finalize)
+    except FormParserError as e:
+        raise UploadFormError(f"Malformed upload: {e}") from e
+    finally:
+        if form.writer is not None:
+            form.writer.discard()
+    return form.fields, form.upload
@@ -1,83 +1,191 @@
 import os
-import time
 from pathlib import Path
 from dotenv import load_dotenv
 from tqdm.auto import tqdm
-from pinecone import Pinecone, ServerlessSpec
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 import asyncio
+from chat.answer_cache import answer_cache
+from config.clients import embed_model
+from config.shared_state import off_loop
+from vectordb import get_index
+from vectordb.upsert import BatchUpserter
+from vectordb.lexical import lexical_index
+from metrics.registry import timed, count
+from docs.manifest import manifest, hash_file, hash_text
+from docs.pdf_parser import iter_pages
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")   # ✅ fixed here
-PINECONE_ENV = os.getenv("PINECONE_ENV")
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
-
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-UPLOAD_DIR = "./uploaded_docs"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-pc = Pinecone(api_key=PINECONE_API_KEY)
-spec = ServerlessSpec(cloud="aws", region=PINECONE_ENV)
-existing_index = [i["name"] for i in pc.list_indexes()]
-
-if PINECONE_INDEX_NAME not in existing_index:
-    pc.create_index(
-        name=PINECONE_INDEX_NAME,
-        dimension=768,
-        metric="dotproduct",
-        spec=spec
-    )
-    while not pc.describe_index(PINECONE_INDEX_NAME).status["ready"]:
-        time.sleep(1)
-
-index = pc.Index(PINECONE_INDEX_NAME)
-
-async def load_vectorstore(uploaded_files, role: str, doc_id: str):
-    embed_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-
-    for file in uploaded_files:
-        save_path = Path(UPLOAD_DIR) / file.filename
-        with open(save_path, "wb") as f:
-            f.write(file.file.read())
-
-        loader = PyPDFLoader(str(save_path))
-        documents = loader.load()
-
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        chunks = splitter.split_documents(documents)
-
-        texts = [chunk.page_content for chunk in chunks]
-        ids = [f"{doc_id}-{i}" for i in range(len(chunks))]
-        metadatas = [
-            {
-                "source": file.filename,
-                "doc_id": doc_id,
-                "role": role,
-                "page": chunk.metadata.get("page", 0)
-            }
-            for i, chunk in enumerate(chunks)
-        ]
-
-        print(f"Embedding {len(texts)} chunks...")
-        embeddings = await asyncio.to_thread(embed_model.embed_documents, texts)
-
-        print("Uploading to Pinecone in batches...")
-        BATCH_SIZE = 100  # tune this if needed
-        with tqdm(total=len(embeddings), desc="Upserting to Pinecone") as progress:
-            for i in range(0, len(embeddings), BATCH_SIZE):
-                batch_ids = ids[i:i + BATCH_SIZE]
-                batch_embeds = embeddings[i:i + BATCH_SIZE]
-                batch_meta = metadatas[i:i + BATCH_SIZE]
-
-                try:
-                    index.upsert(vectors=list(zip(batch_ids, batch_embeds, batch_meta)))
-                except Exception as e:
-                    print(f"⚠️ Batch {i//BATCH_SIZE + 1} failed: {e}")
-
-                progress.update(len(batch_embeds))
-
-        print(f"✅ Upload complete for {file.filename}")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 100))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", 2))
+DELETE_BATCH_SIZE = 1000
+
+async def _run_stages(*stages):
+    tasks = [asyncio.create_task(stage) for stage in stages]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def index_document(save_path: Path, filename: str, role: str, doc_id: str, progress: dict = None,
+                         file_hash: str = None):
+    """Parse, embed and upsert one PDF as a three-stage pipeline.
+
+    Pages are parsed in order (across a process pool for large files) and
+    split as they arrive; chunks flow to the embedder and then the upserter
+    in EMBED_BATCH_SIZE batches through queues of depth INGEST_QUEUE_DEPTH,
+    so at most a few batches are held in memory and embedding overlaps with
+    upserting.
+
+    Re-indexing is incremental against the manifest: a file already indexed
+    for this role is skipped, pages whose text is unchanged are left alone,
+    chunks whose text is already indexed reuse the stored embedding, and
+    vectors of pages that changed or disappeared are deleted.
+
+    Returns the ids of vectors that could not be upserted after retries.
+    """
+    if progress is None:
+        progress = {}
+    for counter in ("pages_parsed", "pages_unchanged", "chunks_embedded", "chunks_reused",
+                    "vectors_upserted", "vectors_deleted"):
+        progress.setdefault(counter, 0)
+    index = get_index()
+    # another worker may have written these since this process read them
+    index.refresh(force=True)
+    lexical_index.refresh(force=True)
+
+    if not file_hash:
+        with timed("ingest_hash"):
+            file_hash = await asyncio.to_thread(hash_file, save_path)
+    if manifest.find_by_hash(role, file_hash):
+        progress["skipped"] = True
+        count("documents_skipped")
+        print(f"⏭️ {filename} is already indexed for {role}, skipping")
+        return []
+
+    previous = manifest.get(role, filename)
+    old_pages = previous["pages"] if previous and previous["doc_id"] == doc_id else {}
+    known_chunks = manifest.chunk_ids(role)
+    new_pages = {}
+
+    embedder = embed_model.get()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+
+    to_embed = asyncio.Queue(maxsize=INGEST_QUEUE_DEPTH)
+    to_upsert = asyncio.Queue(maxsize=INGEST_QUEUE_DEPTH)
+
+    async def parse():
+        batch = []
+        async for page in iter_pages(save_path):
+            progress["pages_parsed"] += 1
+            page_no = page.metadata.get("page", 0)
+            page_hash = hash_text(page.page_content)
+            old_page = old_pages.get(str(page_no))
+            if old_page and old_page["hash"] == page_hash:
+                new_pages[str(page_no)] = old_page
+                progress["pages_unchanged"] += 1
+                continue
+
+            page_chunks = []
+            for i, chunk in enumerate(splitter.split_documents([page])):
+                vector_id = f"{doc_id}-{page_no}-{i}"
+                chunk_hash = hash_text(chunk.page_content)
+                page_chunks.append([vector_id, chunk_hash])
+                batch.append((
+                    vector_id,
+                    {
+                        "source": filename,
+                        "doc_id": doc_id,
+                        "role": role,
+                        "page": chunk.metadata.get("page", 0),
+                        "text": chunk.page_content
+                    },
+                    known_chunks.get(chunk_hash)
+                ))
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    await to_embed.put(batch)
+                    batch = []
+            new_pages[str(page_no)] = {"hash": page_hash, "chunks": page_chunks}
+        if batch:
+            await to_embed.put(batch)
+        await to_embed.put(None)
+
+    async def embed():
+        while (batch := await to_embed.get()) is not None:
+            reuse_ids = [reuse_id for _, _, reuse_id in batch if reuse_id]
+            stored = {}
+            if reuse_ids:
+                with timed("ingest_fetch_reused"):
+                    stored = await asyncio.to_thread(index.fetch, reuse_ids)
+
+            vectors, pending = [], []
+            for vector_id, meta, reuse_id in batch:
+                # ids are positional, so an earlier batch of this run may have
+                # overwritten reuse_id with another chunk: reuse on matching text only
+                if reuse_id in stored and stored[reuse_id][1].get("text") == meta["text"]:
+                    vectors.append((vector_id, stored[reuse_id][0], meta))
+                else:
+                    pending.append((vector_id, meta))
+            progress["chunks_reused"] += len(vectors)
+            count("chunks_reused", len(vectors))
+
+            if pending:
+                texts = [meta["text"] for _, meta in pending]
+                with timed("ingest_embed_batch"):
+                    embeddings = await asyncio.to_thread(embedder.embed_documents, texts)
+                progress["chunks_embedded"] += len(embeddings)
+                count("chunks_embedded", len(embeddings))
+                vectors.extend((vid, emb, meta) for (vid, meta), emb in zip(pending, embeddings))
+            await to_upsert.put(vectors)
+        await to_upsert.put(None)
+
+    def upserted(n):
+        progress["vectors_upserted"] += n
+        count("vectors_upserted", n)
+        bar.update(n)
+
+    upserter = BatchUpserter(index, on_upserted=upserted)
+
+    async def upsert():
+        while (vectors := await to_upsert.get()) is not None:
+            lexical_index.add(role, vectors)
+            await upserter.submit(vectors)
+
+    with tqdm(desc=f"Indexing {filename}", unit="chunk") as bar, timed("ingest_pipeline"):
+        try:
+            await _run_stages(parse(), embed(), upsert())
+            failed_ids = await upserter.drain()
+        except BaseException:
+            upserter.cancel()
+            raise
+
+    if failed_ids:
+        # keep the old vectors and manifest so the next upload retries these pages
+        lexical_index.delete(failed_ids)
+        lexical_index.flush()
+        index.flush()
+        progress["failed_ids"] = failed_ids
+        count("upsert_failures", len(failed_ids))
+        print(f"⚠️ {len(failed_ids)} vectors for {filename} could not be upserted")
+        return failed_ids
+
+    new_ids = {vector_id for page in new_pages.values() for vector_id, _ in page["chunks"]}
+    stale_ids = [vector_id for page in old_pages.values() for vector_id, _ in page["chunks"]
+                 if vector_id not in new_ids]
+    with timed("ingest_delete_stale"):
+        for i in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+            await asyncio.to_thread(index.delete, stale_ids[i:i + DELETE_BATCH_SIZE])
+    count("vectors_deleted", len(stale_ids))
+    lexical_index.delete(stale_ids)
+    progress["vectors_deleted"] = len(stale_ids)
+
+    index.flush()
+    lexical_index.flush()
+    manifest.record(role, filename, doc_id, file_hash, new_pages)
+    # answers cached for this role may now be incomplete
+    await off_loop(answer_cache.invalidate_role, role)
+    print(f"✅ Upload complete for {filename}")
+    return []
@@ -1,16 +1,51 @@
 import os
-from fastapi import FastAPI
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
 from auth.routes import router as auth_router
 from docs.routes import router as docs_router
 from chat.routes import router as chat_router
+from metrics.routes import router as metrics_router
+from metrics.registry import ServerTimingMiddleware
+from chat.admission import OverloadedError
+from config.clients import warm_up, readiness
+from docs import pdf_parser
 
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 1000))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.getenv("WEB_CONCURRENCY", 1)))
 
-app=FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # clients are created lazily; warming them in the background keeps startup
+    # fast and lets the app boot even when a dependency is down
+    warmup = asyncio.create_task(warm_up()) if WARMUP_ON_STARTUP else None
+    yield
+    if warmup:
+        warmup.cancel()
+    pdf_parser.shutdown()
+
+
+app=FastAPI(lifespan=lifespan)
+app.add_middleware(ServerTimingMiddleware)
+# compresses JSON answers, batches and /metrics; event streams are left as-is
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
 
 app.include_router(auth_router)
 app.include_router(docs_router)
 app.include_router(chat_router)
+app.include_router(metrics_router)
+
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    # shed load quickly; clients back off instead of piling onto the queue
+    return JSONResponse({"detail": str(exc)}, status_code=429, headers={"Retry-After": str(exc.retry_after)})
 
 
 @app.get("/health")
@@ -18,9 +53,23 @@ def health_check():
     return {"message":"OK"}
 
 
+@app.get("/ready")
+async def ready_check():
+    await warm_up(only_missing=True)
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 def main():
     port = int(os.environ.get("PORT", 8080))  # Use Render's PORT or default to 8000 locally
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if SERVER_WORKERS <= 1:
+        uvicorn.run(app, host="0.0.0.0", port=port)
+        return
+    # worker processes inherit these: caches, rate limits and ingestion jobs go
+    # through one SQLite file, and the credential-cache key stays in memory only
+    os.environ.setdefault("SHARED_STATE_PATH", "./shared_state.db")
+    os.environ.setdefault("AUTH_CACHE_SECRET", secrets.token_hex(32))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=SERVER_WORKERS)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
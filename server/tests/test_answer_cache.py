@@ -0,0 +1,49 @@
+from chat.answer_cache import AnswerCache
+from config.shared_state import SharedState
+
+
+def test_exact_answers_are_keyed_by_normalized_query():
+    cache = AnswerCache()
+    cache.put_exact("doctor", "Metformin", {"answer": "a biguanide", "sources": []})
+
+    assert cache.get_exact("doctor", "  metformin ")["answer"] == "a biguanide"
+    assert cache.get_exact("nurse", "metformin") is None
+    cache.invalidate_role("doctor")
+    assert cache.get_exact("doctor", "metformin") is None
+
+
+def test_exact_answers_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first, second = AnswerCache(shared=SharedState(path)), AnswerCache(shared=SharedState(path))
+    first.put_exact("doctor", "heparin", {"answer": "an anticoagulant", "sources": []})
+
+    assert second.get_exact("doctor", "heparin")["answer"] == "an anticoagulant"
+    first.invalidate_role("doctor")
+    assert second.get_exact("doctor", "heparin") is None
+
+
+def test_pruning_keeps_invalidations_until_they_expire(tmp_path, monkeypatch):
+    monkeypatch.setattr("chat.answer_cache.SHARED_LOG_ROWS", 10)
+    path = str(tmp_path / "shared.db")
+    busy, idle = AnswerCache(shared=SharedState(path)), AnswerCache(shared=SharedState(path))
+    busy.put_exact("doctor", "heparin", {"answer": "stale", "sources": []})
+    assert idle.get_exact("doctor", "heparin")["answer"] == "stale"
+
+    busy.invalidate_role("doctor")
+    for i in range(200):
+        busy.put_exact("nurse", f"question {i}", {"answer": "a", "sources": []})
+
+    assert idle.get_exact("doctor", "heparin") is None
+
+
+def test_answers_started_before_an_invalidation_are_not_cached():
+    cache = AnswerCache()
+    generation = cache.generation("doctor")
+    cache.invalidate_role("doctor")  # a document finished indexing meanwhile
+    cache.put_exact("doctor", "metformin", {"answer": "from old context", "sources": []}, generation)
+    cache.put("doctor", [1.0, 0.0], {"answer": "from old context", "sources": []}, generation)
+    assert cache.get_exact("doctor", "metformin") is None
+    assert cache.get("doctor", [1.0, 0.0]) is None
+
+    cache.put_exact("doctor", "metformin", {"answer": "fresh", "sources": []}, cache.generation("doctor"))
+    assert cache.get_exact("doctor", "metformin")["answer"] == "fresh"
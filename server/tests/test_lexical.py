@@ -0,0 +1,45 @@
+import json
+import time
+from vectordb.lexical import LexicalIndex, FLUSH_INTERVAL
+
+
+def _chunk(chunk_id, role, text):
+    return chunk_id, {"text": text, "role": role, "source": "s.pdf"}
+
+
+def _stale(index):
+    # as in a worker that last flushed long ago
+    index._last_flush = time.monotonic() - 10 * FLUSH_INTERVAL
+    return index
+
+
+def test_refresh_keeps_every_role(tmp_path):
+    path = str(tmp_path / "lexical_index.json")
+    writer = LexicalIndex(path)
+    reader = _stale(LexicalIndex(path))
+    writer.add("doctor", [_chunk("d-0", "doctor", "aspirin relieves headaches")])
+    writer.add("nurse", [_chunk("n-0", "nurse", "wound dressing changes")])
+    writer.flush()
+
+    reader.refresh(force=True)
+
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["doctor", "nurse"]
+    assert [m["id"] for m in reader.search("doctor", "aspirin", 5)] == ["d-0"]
+    assert [m["id"] for m in reader.search("nurse", "wound dressing", 5)] == ["n-0"]
+
+
+def test_refresh_picks_up_later_writes(tmp_path):
+    path = str(tmp_path / "lexical_index.json")
+    writer = LexicalIndex(path)
+    reader = _stale(LexicalIndex(path))
+    writer.add("doctor", [_chunk("d-0", "doctor", "aspirin relieves headaches")])
+    writer.flush()
+    reader.refresh(force=True)
+    writer.add("nurse", [_chunk("n-0", "nurse", "wound dressing changes")])
+    writer.flush()
+
+    _stale(reader).refresh(force=True)
+
+    assert [m["id"] for m in reader.search("nurse", "wound", 5)] == ["n-0"]
+    assert [m["id"] for m in reader.search("doctor", "aspirin", 5)] == ["d-0"]
@@ -0,0 +1,50 @@
+import threading
+from chat.memory import ConversationMemory, MEMORY_RING_SIZE
+
+
+def test_summarizer_runs_outside_the_lock(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_summary(summary, turns):
+        started.set()
+        assert release.wait(5)
+        return f"{len(turns)} earlier turns"
+
+    memory = ConversationMemory(str(tmp_path), summarize=slow_summary)
+    for i in range(MEMORY_RING_SIZE):
+        memory.append("alice", f"question {i}", "answer")
+    folding = threading.Thread(target=memory.append, args=("alice", "one more", "answer"))
+    folding.start()
+    assert started.wait(5)
+
+    # other users are not held up by alice's summary
+    memory.append("bob", "hello", "hi")
+    assert memory.last_question("bob") == "hello"
+    assert memory.last_question("alice") == "one more"
+
+    release.set()
+    folding.join(5)
+    assert memory.history("alice", token_budget=10_000).startswith(f"{MEMORY_RING_SIZE // 2} earlier turns")
+
+
+def test_reload_folds_evicted_turns(tmp_path):
+    memory = ConversationMemory(str(tmp_path))
+    for i in range(MEMORY_RING_SIZE + 1):
+        memory.append("carol", f"question {i}", "answer")
+
+    reloaded = ConversationMemory(str(tmp_path))
+    history = reloaded.history("carol", token_budget=10_000)
+    assert "question 0" in history
+    assert history.endswith(f"User: question {MEMORY_RING_SIZE}\nAssistant: answer")
+
+
+def test_similar_usernames_get_separate_logs(tmp_path):
+    memory = ConversationMemory(str(tmp_path))
+    memory.append("dr smith", "what dose of metformin", "500 mg")
+    memory.append("dr_smith", "hello", "hi")
+
+    assert memory.last_question("dr smith") == "what dose of metformin"
+    assert memory.last_question("dr_smith") == "hello"
+    memory.clear("dr_smith")
+    assert memory.last_question("dr smith") == "what dose of metformin"
+    assert ConversationMemory(str(tmp_path)).last_question("dr_smith") is None
@@ -0,0 +1,144 @@
+import asyncio
+from chat.single_flight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_call():
+    async def main():
+        flight, calls = SingleFlight("test"), []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"answer": 42}
+
+        results = await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
+        assert flight.in_flight() == 0
+
+    run(main())
+
+
+def test_error_reaches_every_waiter():
+    async def main():
+        flight = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+        assert [str(r) for r in results] == ["upstream down"] * 3
+        assert flight.in_flight() == 0
+
+    run(main())
+
+
+def test_cancelling_one_waiter_keeps_the_call_for_others():
+    async def main():
+        flight = SingleFlight("test")
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", compute))
+        second = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "done"
+        assert first.cancelled()
+
+    run(main())
+
+
+def test_cancelling_the_last_waiter_cancels_the_call():
+    async def main():
+        flight, cancelled = SingleFlight("test"), asyncio.Event()
+
+        async def compute():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flight.in_flight() == 0
+
+        # the next caller starts afresh instead of joining the cancelled call
+        async def quick():
+            return "fresh"
+
+        assert await flight.do("key", quick) == "fresh"
+
+    run(main())
+
+
+def test_late_stream_joiner_replays_earlier_events():
+    async def main():
+        flight, produced = SingleFlight("test"), asyncio.Event()
+
+        async def events():
+            yield "sources"
+            yield "token"
+            produced.set()
+            await asyncio.sleep(0.02)
+            yield "done"
+
+        async def consume():
+            return [e async for e in flight.stream("key", events)]
+
+        early = asyncio.create_task(consume())
+        await produced.wait()
+        late = asyncio.create_task(consume())
+        assert await early == await late == ["sources", "token", "done"]
+        assert flight.in_flight() == 0
+
+    run(main())
+
+
+def test_stream_error_reaches_every_consumer():
+    async def main():
+        flight = SingleFlight("test")
+
+        async def events():
+            yield "sources"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("stream broke")
+
+        async def consume():
+            return [e async for e in flight.stream("key", events)]
+
+        for result in await asyncio.gather(consume(), consume(), return_exceptions=True):
+            assert isinstance(result, RuntimeError)
+
+    run(main())
+
+
+def test_closing_the_last_stream_consumer_stops_the_stream():
+    async def main():
+        flight, stopped = SingleFlight("test"), asyncio.Event()
+
+        async def events():
+            try:
+                yield "sources"
+                await asyncio.sleep(10)
+                yield "never"
+            finally:
+                stopped.set()
+
+        stream = flight.stream("key", events)
+        assert await stream.__anext__() == "sources"
+        await stream.aclose()
+        await asyncio.wait_for(stopped.wait(), 1)
+        assert flight.in_flight() == 0
+
+    run(main())
@@ -0,0 +1,28 @@
+import os
+from dotenv import load_dotenv
+from config.clients import LazyClient
+from .base import VectorStore
+
+load_dotenv()
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")  # "pinecone" or "local"
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./vector_index")
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")  # or "float16"
+EMBED_DIM = int(os.getenv("EMBED_DIM", 768))
+
+
+def create_index() -> VectorStore:
+    if VECTOR_BACKEND == "local":
+        from .local_store import LocalVectorStore
+        return LocalVectorStore(LOCAL_INDEX_PATH, dimension=EMBED_DIM, dtype=LOCAL_INDEX_DTYPE)
+    if VECTOR_BACKEND == "pinecone":
+        from .pinecone_store import PineconeStore
+        return PineconeStore(dimension=EMBED_DIM)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+
+
+vector_index = LazyClient("vector_index", create_index)
+
+
+def get_index() -> VectorStore:
+    return vector_index.get()
@@ -0,0 +1,37 @@
+class VectorStore:
+    """Minimal index interface shared by the Pinecone and local backends.
+
+    Vectors are `(id, values, metadata)` tuples and `query` returns the same
+    `{"matches": [{"id", "score", "metadata"}]}` shape Pinecone does, so callers
+    do not care which backend is configured.
+    """
+
+    def upsert(self, vectors):
+        raise NotImplementedError
+
+    def query(self, vector, top_k: int, filter: dict = None, include_metadata: bool = True):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def fetch(self, ids) -> dict:
+        """Return `{id: (values, metadata)}` for the ids that exist."""
+        raise NotImplementedError
+
+    def list_ids(self) -> list:
+        """Every stored vector id."""
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def refresh(self, force: bool = False):
+        """Pick up writes made by another process, for file-backed stores."""
+        pass
+
+
+def as_tuple(vector):
+    if isinstance(vector, dict):
+        return vector["id"], vector["values"], vector.get("metadata", {})
+    return tuple(vector)
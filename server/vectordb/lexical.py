@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import math
+import time
+import atexit
+import threading
+from collections import Counter
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./lexical_index.json")
+BM25_K1 = 1.2
+BM25_B = 0.75
+FLUSH_INTERVAL = 2.0
+RELOAD_CHECK_INTERVAL = 1.0  # how often readers look for a file rewritten by another process
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or
+should tell that the this to was what when where which who why will with you
+""".split())
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, top_k: int, k: int = 60) -> list:
+    """Merge ranked match lists by sum of 1/(k + rank); each fused match keeps
+    the first-seen match dict (and its score) plus an `rrf` field."""
+    fused = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking):
+            entry = fused.setdefault(match["id"], dict(match, rrf=0.0))
+            entry["rrf"] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda m: m["rrf"], reverse=True)[:top_k]
+
+
+class _Partition:
+    def __init__(self):
+        self.postings = {}   # term -> {chunk_id: tf}
+        self.lengths = {}    # chunk_id -> token count
+        self.docs = {}       # chunk_id -> metadata
+        self.total_len = 0
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk texts, one partition per role.
+
+    Written by ingestion alongside the vector upserts and persisted to
+    LEXICAL_INDEX_PATH; `search` returns Pinecone-shaped matches (flagged
+    `lexical`, score is BM25) so results can be fused with dense retrieval.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._partitions = {}
+        self._role_of = {}
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._last_check = time.monotonic()
+        self._mtime = None
+        self._load()
+        atexit.register(self.flush)
+
+    def _partition(self, role: str) -> _Partition:
+        part = self._partitions.get(role)
+        if part is None:
+            part = self._partitions[role] = _Partition()
+        return part
+
+    def add(self, role: str, vectors):
+        """Index `(id, metadata)` or `(id, values, metadata)` entries for `role`."""
+        with self._lock:
+            self._add_unlocked(role, vectors)
+            self._maybe_flush()
+
+    def _add_unlocked(self, role: str, vectors):
+        part = self._partition(role)
+        for entry in vectors:
+            chunk_id, metadata = entry[0], entry[-1]
+            self._remove(chunk_id)
+            terms = Counter(tokenize(metadata.get("text", "")))
+            for term, tf in terms.items():
+                part.postings.setdefault(term, {})[chunk_id] = tf
+            length = sum(terms.values())
+            part.lengths[chunk_id] = length
+            part.total_len += length
+            part.docs[chunk_id] = dict(metadata)
+            self._role_of[chunk_id] = role
+
+    def delete(self, ids):
+        with self._lock:
+            for chunk_id in ids:
+                self._remove(chunk_id)
+            self._maybe_flush()
+
+    def _remove(self, chunk_id: str):
+        role = self._role_of.pop(chunk_id, None)
+        if role is None:
+            return
+        part = self._partitions[role]
+        metadata = part.docs.pop(chunk_id)
+        part.total_len -= part.lengths.pop(chunk_id)
+        for term in set(tokenize(metadata.get("text", ""))):
+            postings = part.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del part.postings[term]
+
+    def search(self, role: str, query: str, top_k: int) -> list:
+        self.refresh()
+        with self._lock:
+            part = self._partitions.get(role)
+            terms = set(tokenize(query))
+            if part is None or not part.lengths or not terms:
+                return []
+            n = len(part.lengths)
+            avg_len = part.total_len / n
+            scores = Counter()
+            for term in terms:
+                postings = part.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * part.lengths[chunk_id] / avg_len)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            return [
+                {"id": chunk_id, "score": score, "metadata": dict(part.docs[chunk_id]), "lexical": True}
+                for chunk_id, score in scores.most_common(top_k)
+            ]
+
+    def confidence(self, role: str, query: str, matches: list) -> float:
+        """Best match score relative to an average-length chunk containing
+        every query term once (capped at 1). Near 1 means all the rare terms
+        of the query were found together."""
+        if not matches:
+            return 0.0
+        with self._lock:
+            part = self._partitions.get(role)
+            n = len(part.lengths)
+            best = 0.0
+            for term in set(tokenize(query)):
+                df = len(part.postings.get(term, ()))
+                best += math.log(1 + (n - df + 0.5) / (df + 0.5))
+        return min(1.0, matches[0]["score"] / best) if best else 0.0
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        # no flushing while loading: a partial write would drop the other roles
+        with self._lock:
+            for role, docs in stored.items():
+                self._add_unlocked(role, docs.items())
+        self._dirty = False
+        self._mtime = mtime
+
+    def refresh(self, force: bool = False):
+        """Reload if another process rewrote the file since we read it.
+        Unflushed local changes win; `force` skips the check throttle."""
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime or self._dirty:
+                return
+            self._partitions = {}
+            self._role_of = {}
+            self._load()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            stored = {role: part.docs for role, part in self._partitions.items()}
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(tmp, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def _maybe_flush(self):
+        self._dirty = True
+        if time.monotonic() - self._last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+
+lexical_index = LexicalIndex()
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import atexit
+import threading
+import numpy as np
+from .base import VectorStore, as_tuple
+
+META_COLUMNS = ("source", "doc_id", "role", "page", "text")
+FLUSH_INTERVAL = 2.0
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class LocalVectorStore(VectorStore):
+    """In-process index for small corpora.
+
+    Embeddings live in a memory-mapped `vectors.bin` (float32 or float16,
+    one row per chunk) and metadata in a columnar `columns.json` side table.
+    Queries are a single vectorized dot product over the live rows with the
+    metadata filter applied as a boolean mask. Readers in other processes
+    reload when `columns.json` is replaced.
+    """
+
+    def __init__(self, path: str, dimension: int = 768, dtype: str = "float32"):
+        self.path = path
+        self.dim = dimension
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._vec_path = os.path.join(path, "vectors.bin")
+        self._col_path = os.path.join(path, "columns.json")
+        os.makedirs(path, exist_ok=True)
+
+        self.ids = []
+        self.columns = {name: [] for name in META_COLUMNS}
+        self.alive = np.zeros(0, dtype=bool)
+        self.role_codes = np.zeros(0, dtype=np.int32)
+        self.role_names = []
+        self._row = {}
+        self._capacity = 0
+        self._vectors = None
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._last_check = time.monotonic()
+        self._mtime = None
+        self._load()
+        atexit.register(self.flush)
+
+    # storage
+
+    def _load(self):
+        if os.path.exists(self._col_path):
+            self._mtime = os.stat(self._col_path).st_mtime_ns
+            with open(self._col_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            self.dim = stored["dim"]
+            self.dtype = np.dtype(stored["dtype"])
+            self.ids = stored["ids"]
+            for name in META_COLUMNS:
+                self.columns[name] = stored["columns"].get(name, [None] * len(self.ids))
+            self.alive = np.array(stored["alive"], dtype=bool)
+            self.role_names = stored["role_names"]
+            self.role_codes = np.array(stored["role_codes"], dtype=np.int32)
+            self._row = {vid: i for i, vid in enumerate(self.ids)}
+        self._open(max(len(self.ids), 1024))
+
+    def _open(self, capacity: int):
+        row_bytes = self.dim * self.dtype.itemsize
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vec_path, "ab") as f:
+            if f.tell() < capacity * row_bytes:
+                f.truncate(capacity * row_bytes)
+        self._capacity = capacity
+        self._vectors = np.memmap(self._vec_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self._vectors.flush()
+            stored = {
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+                "ids": self.ids,
+                "columns": self.columns,
+                "alive": self.alive.tolist(),
+                "role_names": self.role_names,
+                "role_codes": self.role_codes.tolist(),
+            }
+            tmp = f"{self._col_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(tmp, self._col_path)
+            self._mtime = os.stat(self._col_path).st_mtime_ns
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self._col_path).st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime or self._dirty:
+                return
+            self._load()
+
+    def _maybe_flush(self):
+        self._dirty = True
+        if time.monotonic() - self._last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+    def _role_code(self, role) -> int:
+        if role not in self.role_names:
+            self.role_names.append(role)
+        return self.role_names.index(role)
+
+    # VectorStore
+
+    def upsert(self, vectors):
+        with self._lock:
+            rows = [as_tuple(v) for v in vectors]
+            new = sum(1 for vid, _, _ in rows if vid not in self._row)
+            needed = len(self.ids) + new
+            if needed > self._capacity:
+                self._open(max(needed, self._capacity * 2))
+            if needed > len(self.alive):
+                grow = needed - len(self.alive)
+                self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+                self.role_codes = np.concatenate([self.role_codes, np.full(grow, -1, dtype=np.int32)])
+
+            for vid, values, metadata in rows:
+                row = self._row.get(vid)
+                if row is None:
+                    row = self._row[vid] = len(self.ids)
+                    self.ids.append(vid)
+                    for name in META_COLUMNS:
+                        self.columns[name].append(None)
+                self._vectors[row] = np.asarray(values, dtype=np.float32)
+                for name in META_COLUMNS:
+                    self.columns[name][row] = metadata.get(name)
+                self.role_codes[row] = self._role_code(metadata.get("role"))
+                self.alive[row] = True
+            self._maybe_flush()
+        return {"upserted_count": len(rows)}
+
+    def delete(self, ids):
+        with self._lock:
+            for vid in ids:
+                row = self._row.get(vid)
+                if row is not None:
+                    self.alive[row] = False
+            self._maybe_flush()
+
+    def fetch(self, ids) -> dict:
+        self.refresh()
+        with self._lock:
+            found = {}
+            for vid in ids:
+                row = self._row.get(vid)
+                if row is not None and self.alive[row]:
+                    found[vid] = (self._vectors[row].astype(np.float32).tolist(), self._metadata(row))
+            return found
+
+    def list_ids(self) -> list:
+        self.refresh()
+        with self._lock:
+            return [vid for vid, alive in zip(self.ids, self.alive) if alive]
+
+    def _metadata(self, row: int) -> dict:
+        return {name: self.columns[name][row] for name in META_COLUMNS if self.columns[name][row] is not None}
+
+    def _mask(self, filter: dict, n: int) -> np.ndarray:
+        mask = self.alive[:n].copy()
+        for field, cond in (filter or {}).items():
+            if isinstance(cond, dict):
+                if "$eq" in cond:
+                    allowed = [cond["$eq"]]
+                elif "$in" in cond:
+                    allowed = list(cond["$in"])
+                else:
+                    raise ValueError(f"Unsupported filter operator: {cond}")
+            else:
+                allowed = [cond]
+
+            if field == "role":
+                codes = [self.role_names.index(r) for r in allowed if r in self.role_names]
+                mask &= np.isin(self.role_codes[:n], codes)
+            else:
+                column = self.columns.get(field)
+                if column is None:
+                    raise ValueError(f"Unknown metadata field: {field}")
+                allowed = set(allowed)
+                mask &= np.fromiter((v in allowed for v in column[:n]), dtype=bool, count=n)
+        return mask
+
+    def query(self, vector, top_k: int, filter: dict = None, include_metadata: bool = True):
+        self.refresh()
+        with self._lock:
+            n = len(self.ids)
+            if not n:
+                return {"matches": []}
+            mask = self._mask(filter, n)
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return {"matches": []}
+
+            q = np.asarray(vector, dtype=np.float32)
+            scores = self._vectors[candidates].astype(np.float32, copy=False) @ q
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            matches = []
+            for i in top:
+                row = int(candidates[i])
+                match = {"id": self.ids[row], "score": float(scores[i])}
+                if include_metadata:
+                    match["metadata"] = self._metadata(row)
+                matches.append(match)
+        return {"matches": matches}
@@ -0,0 +1,44 @@
+import os
+import time
+from pinecone import Pinecone, ServerlessSpec
+from .base import VectorStore
+
+# chat_query.py historically read the misspelled PINECIONE_API_KEY
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY") or os.getenv("PINECIONE_API_KEY")
+PINECONE_ENV = os.getenv("PINECONE_ENV")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+
+
+class PineconeStore(VectorStore):
+    def __init__(self, index_name: str = PINECONE_INDEX_NAME, dimension: int = 768):
+        self.pc = Pinecone(api_key=PINECONE_API_KEY)
+        existing_index = [i["name"] for i in self.pc.list_indexes()]
+
+        if index_name not in existing_index:
+            self.pc.create_index(
+                name=index_name,
+                dimension=dimension,
+                metric="dotproduct",
+                spec=ServerlessSpec(cloud="aws", region=PINECONE_ENV)
+            )
+            while not self.pc.describe_index(index_name).status["ready"]:
+                time.sleep(1)
+
+        self.index = self.pc.Index(index_name)
+
+    def upsert(self, vectors):
+        return self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k: int, filter: dict = None, include_metadata: bool = True):
+        return self.index.query(vector=vector, top_k=top_k, filter=filter, include_metadata=include_metadata)
+
+    def delete(self, ids):
+        return self.index.delete(ids=list(ids))
+
+    def fetch(self, ids) -> dict:
+        res = self.index.fetch(ids=list(ids))
+        return {vid: (list(v.values), dict(v.metadata or {})) for vid, v in res.vectors.items()}
+
+    def list_ids(self) -> list:
+        # paginated; only serverless indexes support listing
+        return [vid for page in self.index.list() for vid in page]
@@ -0,0 +1,123 @@
+import os
+import json
+import random
+import asyncio
+from metrics.registry import timed, count
+from .base import as_tuple
+
+UPSERT_PARALLELISM = int(os.getenv("UPSERT_PARALLELISM", 4))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", 5))
+UPSERT_BASE_DELAY = float(os.getenv("UPSERT_BASE_DELAY", 0.5))
+UPSERT_MAX_DELAY = float(os.getenv("UPSERT_MAX_DELAY", 10))
+UPSERT_MAX_BATCH_SIZE = int(os.getenv("UPSERT_MAX_BATCH_SIZE", 200))
+# Pinecone rejects requests over 2MB; leave room for the envelope
+UPSERT_MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", 1_800_000))
+
+# JSON-encoded float32 plus separator
+_BYTES_PER_FLOAT = 12
+
+
+def payload_bytes(vector) -> int:
+    vid, values, metadata = as_tuple(vector)
+    return len(vid) + len(values) * _BYTES_PER_FLOAT + len(json.dumps(metadata or {}))
+
+
+def _too_large(error: Exception) -> bool:
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    return status == 413 or "too large" in str(error).lower()
+
+
+class BatchUpserter:
+    """Upserts vectors with bounded parallelism and retries.
+
+    Incoming vectors are re-batched so each request stays under
+    `max_batch_bytes`; a batch rejected as too large is split in half.
+    Transient failures back off exponentially with full jitter, and ids
+    that still fail after `max_retries` attempts are collected in
+    `failed_ids` instead of being dropped silently.
+    """
+
+    def __init__(self, index, parallelism: int = UPSERT_PARALLELISM, max_retries: int = UPSERT_MAX_RETRIES,
+                 max_batch_size: int = UPSERT_MAX_BATCH_SIZE, max_batch_bytes: int = UPSERT_MAX_BATCH_BYTES,
+                 on_upserted=None):
+        self.index = index
+        self.max_retries = max_retries
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.on_upserted = on_upserted
+        self.upserted = 0
+        self.failed_ids = []
+        self._slots = asyncio.Semaphore(parallelism)
+        self._tasks = set()
+
+    def _batches(self, vectors):
+        batch, size = [], 0
+        for vector in vectors:
+            vector = as_tuple(vector)
+            nbytes = payload_bytes(vector)
+            if batch and (len(batch) >= self.max_batch_size or size + nbytes > self.max_batch_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append(vector)
+            size += nbytes
+        if batch:
+            yield batch
+
+    async def submit(self, vectors):
+        """Schedule `vectors`; waits only while all parallel slots are busy."""
+        for batch in self._batches(vectors):
+            await self._slots.acquire()
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> list:
+        """Wait for every scheduled batch and return the permanently failed ids."""
+        try:
+            while self._tasks:
+                await asyncio.gather(*list(self._tasks))
+        except BaseException:
+            self.cancel()
+            raise
+        return list(self.failed_ids)
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def upsert(self, vectors) -> list:
+        await self.submit(vectors)
+        return await self.drain()
+
+    async def _send(self, batch):
+        try:
+            await self._send_with_retry(batch)
+        finally:
+            self._slots.release()
+
+    async def _send_with_retry(self, batch):
+        attempt = 0
+        while True:
+            try:
+                with timed("upsert_batch"):
+                    await asyncio.to_thread(self.index.upsert, vectors=batch)
+                self.upserted += len(batch)
+                if self.on_upserted:
+                    self.on_upserted(len(batch))
+                return
+            except Exception as e:
+                if _too_large(e) and len(batch) > 1:
+                    # shrink future batches too, then retry both halves
+                    self.max_batch_size = max(1, min(self.max_batch_size, len(batch) // 2))
+                    mid = len(batch) // 2
+                    await self._send_with_retry(batch[:mid])
+                    await self._send_with_retry(batch[mid:])
+                    return
+                attempt += 1
+                if attempt > self.max_retries:
+                    print(f"⚠️ Upsert of {len(batch)} vectors failed permanently: {e}")
+                    self.failed_ids.extend(vid for vid, _, _ in batch)
+                    return
+                count("upsert_retries")
+                delay = random.uniform(0, min(UPSERT_MAX_DELAY, UPSERT_BASE_DELAY * 2 ** attempt))
+                await asyncio.sleep(delay)